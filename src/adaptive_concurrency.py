@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+import logging
+import re
+import threading
+import time
+from typing import Callable, Optional
+
+from git.exc import GitCommandError
+
+# Substrings of git/SSH/HTTP errors that mean the remote side is pushing back
+# (GitHub secondary rate limits, SSH connection throttling, network timeouts).
+CONGESTION_MARKERS = (
+    "too many connections",
+    "kex_exchange_identification",
+    "connection closed by remote host",
+    "connection reset",
+    "timed out",
+    "timeout",
+    "rate limit",
+)
+# HTTP statuses GitHub answers with when throttling (Too Many Requests,
+# Service Unavailable)
+CONGESTION_STATUS = re.compile(r"\b(429|503)\b")
+# Quoted paths, URLs and scp-like remotes in git messages, which may contain
+# any repository name (e.g. org/svc-503)
+NAME_PATTERN = re.compile(r"'[^']*'|\S+://\S*|\S+@\S+:\S*")
+# GitPython keeps the standard error of a failed command as "\n  stderr: '...'"
+GIT_STDERR_PATTERN = re.compile(r"^\s*stderr: '(.*)'\s*$", re.DOTALL)
+
+
+def is_congestion_error(error: BaseException) -> bool:
+    """Return True if ``error`` looks like remote throttling or a timeout.
+
+    Only the message is inspected (the standard error of git commands, not
+    their command line), with repository paths and URLs left out.
+    """
+    if isinstance(error, GitCommandError):
+        message = error.stderr
+        wrapped = GIT_STDERR_PATTERN.match(message)
+        if wrapped:
+            message = wrapped.group(1)
+    else:
+        message = str(error)
+    message = NAME_PATTERN.sub("", message.lower())
+    return bool(CONGESTION_STATUS.search(message)) or any(
+        marker in message for marker in CONGESTION_MARKERS
+    )
+
+
+class AdaptiveConcurrencyLimiter:
+    """Limit concurrent repository workers using additive-increase /
+    multiplicative-decrease (AIMD).
+
+    Completed jobs are grouped into windows of ``limit`` jobs. At the end of a
+    clean window the limit grows by one, unless throughput dropped compared with
+    the previous window, in which case the last increase is undone. The first
+    congestion-style failure of a window, or a window whose error rate exceeds
+    ``max_error_rate``, multiplies the limit by ``decrease_factor``; the limit
+    is decreased at most once per window, since jobs started before a decrease
+    are likely to fail together.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        maximum: int,
+        minimum: int = 1,
+        decrease_factor: float = 0.5,
+        max_error_rate: float = 0.25,
+        throughput_tolerance: float = 0.1,
+        logger: Optional[logging.Logger] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = max(minimum, min(initial, maximum))
+        self.decrease_factor = decrease_factor
+        self.max_error_rate = max_error_rate
+        self.throughput_tolerance = throughput_tolerance
+        self.logger = logger
+        self._clock = clock
+        self._condition = threading.Condition()
+        self._active = 0
+        self._last_throughput: Optional[float] = None
+        self._reset_window()
+
+    def acquire(self) -> None:
+        """Block until a worker slot is available under the current limit."""
+        with self._condition:
+            while self._active >= self.limit:
+                self._condition.wait()
+            self._active += 1
+
+    def release(self, error: Optional[BaseException] = None) -> None:
+        """Free a worker slot and record the outcome of the finished job."""
+        with self._condition:
+            self._active -= 1
+            self._record(error)
+            self._condition.notify_all()
+
+    def _reset_window(self) -> None:
+        self._window_start = self._clock()
+        self._window_completed = 0
+        self._window_errors = 0
+        self._window_decreased = False
+
+    def _record(self, error: Optional[BaseException]) -> None:
+        self._window_completed += 1
+        if error is not None:
+            self._window_errors += 1
+            if not self._window_decreased and is_congestion_error(error):
+                self._set_limit(
+                    int(self.limit * self.decrease_factor), f"congestion: {error}"
+                )
+                self._window_decreased = True
+        if self._window_completed >= self.limit:
+            self._end_window()
+
+    def _end_window(self) -> None:
+        elapsed = max(self._clock() - self._window_start, 1e-6)
+        throughput = self._window_completed / elapsed
+        error_rate = self._window_errors / self._window_completed
+
+        if self._window_decreased:
+            # Start a fresh baseline so the next window is not compared with
+            # throughput measured at the old, higher limit
+            throughput = None
+        elif error_rate > self.max_error_rate:
+            self._set_limit(
+                int(self.limit * self.decrease_factor),
+                f"error rate {error_rate:.0%}",
+            )
+            throughput = None
+        elif (
+            self._last_throughput is not None
+            and throughput < self._last_throughput * (1 - self.throughput_tolerance)
+        ):
+            self._set_limit(
+                self.limit - 1, f"throughput dropped to {throughput:.2f} repos/s"
+            )
+        else:
+            self._set_limit(self.limit + 1, f"throughput {throughput:.2f} repos/s")
+
+        self._last_throughput = throughput
+        self._reset_window()
+
+    def _set_limit(self, limit: int, reason: str) -> None:
+        limit = max(self.minimum, min(limit, self.maximum))
+        if limit != self.limit and self.logger:
+            self.logger.info(
+                f"Adaptive concurrency: {self.limit} -> {limit} workers ({reason})"
+            )
+        self.limit = limit
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+import argparse
+import logging
+import os
+from datetime import datetime
+
+# Per-run bookkeeping kept inside the output directory (e.g. durations)
+STATE_FILENAME = ".downloader_state.json"
+BUNDLE_SUFFIX = ".bundle"
+
+
+def setup_logging(log_prefix: str = "downloader") -> logging.Logger:
+    """Setup logging configuration with both console and file output."""
+    # Create logs directory if it doesn't exist
+    logs_dir = "logs"
+    os.makedirs(logs_dir, exist_ok=True)
+
+    # Create log filename with current date and time
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    log_filename = os.path.join(logs_dir, f"{log_prefix}_{timestamp}.log")
+
+    # Configure logging
+    logger = logging.getLogger(log_prefix)
+    logger.setLevel(logging.INFO)
+
+    # Clear any existing handlers
+    logger.handlers.clear()
+
+    # Create formatter
+    formatter = logging.Formatter(
+        "%(asctime)s - %(levelname)s - %(message)s", datefmt="%Y-%m-%d %H:%M:%S"
+    )
+
+    # File handler
+    file_handler = logging.FileHandler(log_filename, encoding="utf-8")
+    file_handler.setLevel(logging.INFO)
+    file_handler.setFormatter(formatter)
+    logger.addHandler(file_handler)
+
+    # Console handler
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(logging.INFO)
+    console_handler.setFormatter(formatter)
+    logger.addHandler(console_handler)
+
+    logger.info(f"Logging initialized. Log file: {log_filename}")
+    return logger
+
+
+def positive_int(value: str) -> int:
+    """Argparse type for integers greater than zero."""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid integer value: {value!r}")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
+def positive_float(value: str) -> float:
+    """Argparse type for numbers greater than zero."""
+    try:
+        number = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid number: {value!r}")
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be greater than 0, got {number}")
+    return number
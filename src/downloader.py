@@ -1,56 +1,213 @@
 #!/usr/bin/env python3
 
 import argparse
+import copy
+import fcntl
+import hashlib
+import json
 import logging
 import os
+import queue
 import shutil
+import socket
 import sys
-from datetime import datetime
-from typing import List, Optional
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, List, Optional, Tuple
 from urllib.parse import urlparse
 
 from dotenv import load_dotenv
-from github import Github
 from git import Repo
+from git.exc import GitCommandError
 from tqdm import tqdm
 
+from adaptive_concurrency import AdaptiveConcurrencyLimiter
+from common import (
+    BUNDLE_SUFFIX,
+    STATE_FILENAME,
+    positive_float,
+    positive_int,
+    setup_logging,
+)
+from github_api import DEFAULT_RATE, GitHubApi
+from maintenance import MAINTENANCE_COMMANDS, MaintenanceScheduler
+from object_pool import ObjectPool, link_object_pool
+from ref_filter import REF_FILTER_KEYS, RefFilter, validate_ref_pattern
+from ref_reader import RefSnapshot
+from work_queue import LeaseHeartbeat, WorkQueue
+
+REPO_CONFIG_KEYS = REF_FILTER_KEYS + ("sparse_checkout",)
+# Repository metadata from list_org_repos.py --metadata kept in the run state
+REPO_METADATA_KEYS = ("size", "default_branch", "network")
+
+# git clone --filter specs for partial clones
+CLONE_FILTERS = {"blobless": "blob:none", "treeless": "tree:0"}
+
+# Ask for the remote HEAD symref along with branches and tags. ls-remote only
+# applies patterns to the output (they are not sent as ref prefixes), which is
+# what keeps HEAD in the advertisement
+LS_REMOTE_ARGS = ("--symref", "origin", "HEAD", "refs/heads/*", "refs/tags/*")
+# Ask for the remote HEAD symref only, to follow a changed default branch
+LS_REMOTE_HEAD_ARGS = ("--symref", "origin", "HEAD")
+
+
+class RunStats:
+    """Thread-safe counters reported in the end-of-run summary."""
+
+    def __init__(self) -> None:
+        self._counts: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def increment(self, key: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counts[key] += amount
+
+    def get(self, key: str) -> int:
+        with self._lock:
+            return self._counts[key]
+
+
+@dataclass
+class SyncOptions:
+    """How each repository is synchronised, built from the command line."""
+
+    # Create/fast-forward local branches as ref updates, without checkouts
+    ref_only: bool = False
+    # Keep bare mirrors updated with a single remote update
+    mirror: bool = False
+    # Clone without checking out, the local stage populates the working tree
+    no_checkout: bool = False
+    # Compare ls-remote with local refs and skip repositories that match
+    skip_unchanged: bool = False
+    # Partial clone filter spec (e.g. "blob:none"), objects fetched on demand
+    clone_filter: Optional[str] = None
+    # Shallow history limits applied to clones and update fetches
+    depth: Optional[int] = None
+    shallow_since: Optional[str] = None
+    # Default branch per repository slug, cached in the run state and refreshed
+    # from the ls-remote HEAD symref or GitHub API metadata
+    default_branches: Dict[str, str] = field(default_factory=dict)
+    # Shared object pools for fork networks, and the network of each slug
+    object_pool: Optional[ObjectPool] = None
+    fork_networks: Dict[str, str] = field(default_factory=dict)
+    # Directory of <repo_dir_name>.bundle files used to seed new clones
+    bundle_dir: Optional[str] = None
+    # Branch/tag rules for the run, and per-repository settings by slug
+    ref_filter: RefFilter = field(default_factory=RefFilter)
+    repo_configs: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    # Low-priority pool maintaining repositories after they are synced
+    maintenance: Optional[MaintenanceScheduler] = None
+    # Counters shared by all workers for the end-of-run summary
+    stats: RunStats = field(default_factory=RunStats)
+
+    @classmethod
+    def from_args(cls, args) -> "SyncOptions":
+        return cls(
+            ref_only=args.ref_only,
+            mirror=args.mirror,
+            skip_unchanged=args.skip_unchanged,
+            clone_filter=CLONE_FILTERS.get(args.partial_clone),
+            depth=args.depth,
+            shallow_since=args.shallow_since,
+            object_pool=ObjectPool(args.object_pool) if args.object_pool else None,
+            bundle_dir=args.bundle_dir,
+            maintenance=(
+                MaintenanceScheduler(args.maintenance_jobs)
+                if args.maintenance
+                else None
+            ),
+            ref_filter=RefFilter(
+                **{key: getattr(args, key) or [] for key in REF_FILTER_KEYS}
+            ),
+        )
 
-def setup_logging() -> logging.Logger:
-    """Setup logging configuration with both console and file output."""
-    # Create logs directory if it doesn't exist
-    logs_dir = "logs"
-    os.makedirs(logs_dir, exist_ok=True)
-
-    # Create log filename with current date and time
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    log_filename = os.path.join(logs_dir, f"downloader_{timestamp}.log")
-
-    # Configure logging
-    logger = logging.getLogger(__name__)
-    logger.setLevel(logging.INFO)
-
-    # Clear any existing handlers
-    logger.handlers.clear()
-
-    # Create formatter
-    formatter = logging.Formatter(
-        "%(asctime)s - %(levelname)s - %(message)s", datefmt="%Y-%m-%d %H:%M:%S"
-    )
-
-    # File handler
-    file_handler = logging.FileHandler(log_filename, encoding="utf-8")
-    file_handler.setLevel(logging.INFO)
-    file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
+    @property
+    def shallow(self) -> bool:
+        return bool(self.depth or self.shallow_since)
+
+    def history_kwargs(self) -> Dict[str, Any]:
+        """GitPython keyword options limiting fetched history."""
+        if self.depth:
+            return {"depth": self.depth}
+        if self.shallow_since:
+            return {"shallow_since": self.shallow_since}
+        return {}
+
+    def history_args(self) -> List[str]:
+        """``git clone``/``git fetch`` options limiting fetched history."""
+        return [
+            f"--{key.replace('_', '-')}={value}"
+            for key, value in self.history_kwargs().items()
+        ]
+
+    def ref_filter_for(self, repo_slug: str) -> RefFilter:
+        """Branch/tag rules of a repository, per-repository rules first."""
+        return self.ref_filter.override(self.repo_configs.get(repo_slug.lower(), {}))
+
+    def sparse_checkout_for(self, repo_slug: str) -> List[str]:
+        """Sparse checkout directories of a repository, empty for a full tree."""
+        if self.mirror:
+            return []
+        return self.repo_configs.get(repo_slug.lower(), {}).get("sparse_checkout", [])
+
+    def clone_args(self, filtered: bool = False, sparse: bool = False) -> List[str]:
+        """Extra ``git clone`` options for these settings.
+
+        A ``filtered`` clone only fetches the default branch without tags (as a
+        plain bare repository in mirror mode); the remaining refs are fetched
+        afterwards through the filtered refspecs. A ``sparse`` clone only checks
+        out top-level files and, unless another filter or an object pool is
+        used, is blobless so only blobs of the sparse directories are fetched.
+        """
+        args = []
+        if self.mirror:
+            args.append("--bare" if filtered else "--mirror")
+        elif self.no_checkout:
+            args.append("--no-checkout")
+        if self.clone_filter:
+            args.append(f"--filter={self.clone_filter}")
+        elif sparse and not self.object_pool:
+            args.append(f"--filter={CLONE_FILTERS['blobless']}")
+        if sparse:
+            args.append("--sparse")
+        if filtered:
+            args.extend(["--single-branch", "--no-tags"])
+        if self.shallow:
+            args.extend(self.history_args())
+            if not filtered:
+                # A shallow clone only fetches the default branch unless told not to
+                args.append("--no-single-branch")
+        return args
+
+    def mirror_update_args(self) -> List[str]:
+        """Command updating all refs of a mirror."""
+        if self.shallow:
+            # git remote update cannot limit history, fetch the mirror refspec
+            return ["fetch", "--prune", *self.history_args(), "origin"]
+        return ["remote", "update", "--prune"]
+
+
+def shard_spec(value: str) -> Tuple[int, int]:
+    """Argparse type for ``i/N`` shard specifications (1 <= i <= N)."""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected i/N, got {value!r}")
+    if count < 1 or not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"shard must satisfy 1 <= i <= N: {value!r}")
+    return index, count
 
-    # Console handler
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
-    console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
 
-    logger.info(f"Logging initialized. Log file: {log_filename}")
-    return logger
+def ref_pattern(value: str) -> str:
+    """Argparse type for branch/tag globs usable in git refspecs."""
+    try:
+        return validate_ref_pattern(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
 
 
 def parse_args():
@@ -68,7 +225,182 @@ def parse_args():
         action="store_true",
         help="Delete output directory before starting download",
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--jobs",
+        type=positive_int,
+        default=1,
+        help="Number of repositories to process concurrently (default: 1)",
+    )
+    parser.add_argument(
+        "--adaptive",
+        action="store_true",
+        help="Tune the number of active workers at runtime (AIMD), using --jobs "
+        "as the maximum",
+    )
+    parser.add_argument(
+        "--longest-first",
+        action="store_true",
+        help="Start the most expensive repositories first, based on durations "
+        "from previous runs or repository size from the GitHub API",
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="Split processing into a network stage (--jobs workers) and a local "
+        "checkout stage (--local-jobs workers) with bounded queues",
+    )
+    parser.add_argument(
+        "--local-jobs",
+        type=positive_int,
+        default=2,
+        help="Number of local checkout workers in --pipeline mode (default: 2)",
+    )
+    parser.add_argument(
+        "--shard",
+        type=shard_spec,
+        metavar="i/N",
+        help="Only process the repositories assigned to shard i of N",
+    )
+    parser.add_argument(
+        "--queue",
+        metavar="PATH",
+        help="SQLite work queue shared by several downloader processes; the input "
+        "list is added to it and workers claim repositories with leases",
+    )
+    parser.add_argument(
+        "--lease-seconds",
+        type=positive_int,
+        default=600,
+        help="Lease duration for --queue claims, renewed by heartbeats "
+        "(default: 600)",
+    )
+    parser.add_argument(
+        "--ref-only",
+        action="store_true",
+        help="Create and fast-forward local branches as pure ref updates in one "
+        "batch; only the default branch touches the working tree",
+    )
+    parser.add_argument(
+        "--mirror",
+        action="store_true",
+        help="Keep each repository as a bare mirror with all refs, without "
+        "working trees or local branch copies",
+    )
+    parser.add_argument(
+        "--skip-unchanged",
+        action="store_true",
+        help="Compare the remote ref advertisement (ls-remote) with local refs "
+        "and skip repositories whose branches and tags are unchanged",
+    )
+    parser.add_argument(
+        "--partial-clone",
+        choices=sorted(CLONE_FILTERS),
+        help="Clone new repositories without blobs (blobless) or without trees "
+        "and blobs (treeless); missing objects are fetched on demand",
+    )
+    history = parser.add_mutually_exclusive_group()
+    history.add_argument(
+        "--depth",
+        type=positive_int,
+        help="Limit clones and update fetches to the last N commits of every branch",
+    )
+    history.add_argument(
+        "--shallow-since",
+        metavar="DATE",
+        help="Limit clones and update fetches to commits newer than DATE "
+        "(any date git understands, e.g. 2024-01-01 or '6 months ago')",
+    )
+    parser.add_argument(
+        "--object-pool",
+        metavar="DIR",
+        help="Share objects between repositories of the same fork network "
+        "through pool repositories in DIR (git alternates)",
+    )
+    parser.add_argument(
+        "--bundle-dir",
+        metavar="DIR",
+        help="Seed new clones from DIR/<owner_repo>.bundle when present, then "
+        "fetch only the missing objects from the remote (git 2.38+)",
+    )
+    parser.add_argument(
+        "--maintenance",
+        action="store_true",
+        help="After each repository is synced, run the maintenance it needs "
+        "(commit-graph, geometric repack, multi-pack-index, pack-refs) in a "
+        "separate low-priority pool",
+    )
+    parser.add_argument(
+        "--maintenance-jobs",
+        type=positive_int,
+        default=1,
+        help="Number of concurrent --maintenance workers (default: 1)",
+    )
+    parser.add_argument(
+        "--include-branch",
+        dest="include_branches",
+        action="append",
+        type=ref_pattern,
+        metavar="GLOB",
+        help="Only sync branches matching GLOB (repeatable, at most one '*')",
+    )
+    parser.add_argument(
+        "--exclude-branch",
+        dest="exclude_branches",
+        action="append",
+        type=ref_pattern,
+        metavar="GLOB",
+        help="Never sync branches matching GLOB, e.g. 'dependabot/*' (repeatable)",
+    )
+    parser.add_argument(
+        "--include-tag",
+        dest="include_tags",
+        action="append",
+        type=ref_pattern,
+        metavar="GLOB",
+        help="Only sync tags matching GLOB (repeatable, at most one '*')",
+    )
+    parser.add_argument(
+        "--exclude-tag",
+        dest="exclude_tags",
+        action="append",
+        type=ref_pattern,
+        metavar="GLOB",
+        help="Never sync tags matching GLOB (repeatable)",
+    )
+    parser.add_argument(
+        "--repo-config",
+        metavar="PATH",
+        help="JSON file with per-repository settings keyed by owner/repo, e.g. "
+        "branch/tag rules that replace the command line ones",
+    )
+    parser.add_argument(
+        "--api-rate",
+        type=positive_float,
+        default=DEFAULT_RATE,
+        metavar="N",
+        help="Maximum GitHub API requests per second; requests also wait for "
+        f"rate limit resets instead of failing (default: {DEFAULT_RATE:g})",
+    )
+    parser.add_argument(
+        "--metadata",
+        metavar="PATH",
+        help="JSON repository metadata written by list_org_repos.py --metadata; "
+        "sizes, default branches and fork networks it holds are not looked up "
+        "through the API",
+    )
+    args = parser.parse_args()
+    if args.queue and args.pipeline:
+        parser.error("--queue cannot be combined with --pipeline")
+    if args.ref_only and args.mirror:
+        parser.error("--ref-only cannot be combined with --mirror")
+    if args.bundle_dir and (args.depth or args.shallow_since):
+        parser.error("--bundle-dir cannot be combined with --depth or --shallow-since")
+    if args.object_pool and (args.partial_clone or args.depth or args.shallow_since):
+        parser.error(
+            "--object-pool needs complete objects and cannot be combined with "
+            "--partial-clone, --depth or --shallow-since"
+        )
+    return args
 
 
 def read_repos_file(file_path: str, logger: logging.Logger) -> List[str]:
@@ -84,6 +416,49 @@ def read_repos_file(file_path: str, logger: logging.Logger) -> List[str]:
         sys.exit(1)
 
 
+def load_repo_config(
+    file_path: str, logger: logging.Logger
+) -> Dict[str, Dict[str, Any]]:
+    """Read per-repository settings from a JSON object keyed by ``owner/repo``."""
+    try:
+        logger.info(f"Reading per-repository config: {file_path}")
+        with open(file_path, "r") as f:
+            configs = {slug.lower(): rules for slug, rules in json.load(f).items()}
+        for slug, rules in configs.items():
+            unknown = set(rules) - set(REPO_CONFIG_KEYS)
+            if unknown:
+                raise ValueError(
+                    f"{slug}: unknown settings {', '.join(sorted(unknown))}"
+                )
+            RefFilter().override(rules)
+            directories = rules.get("sparse_checkout", [])
+            if not isinstance(directories, list) or not all(
+                isinstance(directory, str) and directory.strip("/")
+                for directory in directories
+            ):
+                raise ValueError(f"{slug}: sparse_checkout must list directories")
+        logger.info(f"Found settings for {len(configs)} repositories")
+        return configs
+    except Exception as e:
+        logger.error(f"Error: invalid repository config {file_path}: {str(e)}")
+        sys.exit(1)
+
+
+def load_repo_metadata(
+    file_path: str, logger: logging.Logger
+) -> Dict[str, Dict[str, Any]]:
+    """Read repository metadata from a JSON object keyed by ``owner/repo``."""
+    try:
+        logger.info(f"Reading repository metadata: {file_path}")
+        with open(file_path, "r") as f:
+            metadata = {slug.lower(): entry for slug, entry in json.load(f).items()}
+        logger.info(f"Found metadata for {len(metadata)} repositories")
+        return metadata
+    except Exception as e:
+        logger.error(f"Error: invalid repository metadata {file_path}: {str(e)}")
+        sys.exit(1)
+
+
 def get_repo_name_from_url(url: str) -> str:
     """Extract repository name from SSH or HTTPS URL."""
     parsed = urlparse(url)
@@ -101,17 +476,88 @@ def get_repo_name_from_url(url: str) -> str:
     return path
 
 
-def get_default_branch(git_repo: Repo) -> Optional[str]:
-    """Get the default branch of the repository."""
-    try:
-        remote = git_repo.remote()
-        remote.fetch()
-        return remote.refs[0].name.replace("origin/", "")
-    except Exception:
-        try:
-            return git_repo.active_branch.name
-        except Exception:
-            return None
+def get_repo_slug(url: str) -> str:
+    """Return the ``owner/repo`` part of an SSH or HTTPS URL."""
+    return get_repo_name_from_url(url).split(":")[-1].strip("/")
+
+
+def get_repo_shard(repo_url: str, shard_count: int) -> int:
+    """Return the 1-based shard a repository belongs to.
+
+    Uses rendezvous (highest random weight) hashing on the lowercased
+    ``owner/repo`` name, so the assignment is stable across runs and hosts and
+    going from N to N+1 shards only moves about 1/(N+1) of the repositories.
+    """
+    name = get_repo_slug(repo_url).lower()
+
+    def weight(shard: int) -> bytes:
+        return hashlib.sha256(f"{shard}:{name}".encode("utf-8")).digest()
+
+    return max(range(1, shard_count + 1), key=weight)
+
+
+def filter_shard(
+    repos: List[str], shard_index: int, shard_count: int, logger: logging.Logger
+) -> List[str]:
+    """Keep only the repositories assigned to shard ``shard_index``."""
+    selected = [
+        repo for repo in repos if get_repo_shard(repo, shard_count) == shard_index
+    ]
+    logger.info(
+        f"Shard {shard_index}/{shard_count}: {len(selected)} of {len(repos)} "
+        "repositories assigned to this node"
+    )
+    return selected
+
+
+class RepoLoggerAdapter(logging.LoggerAdapter):
+    """Prefix every log message with the repository it belongs to."""
+
+    def process(self, msg, kwargs):
+        return f"[{self.extra['repo']}] {msg}", kwargs
+
+
+def get_default_branch(
+    git_repo: Repo, refs: Optional[RefSnapshot] = None
+) -> Optional[str]:
+    """Get the default branch of the repository from the locally cached remote
+    HEAD symref (``refs/remotes/origin/HEAD``), without contacting the remote.
+
+    Falls back to the checked-out branch when the symref is missing. ``refs``
+    is read from the repository unless a snapshot is passed in.
+    """
+    return default_branch_from_refs(refs or RefSnapshot.read(git_repo.git_dir))
+
+
+def default_branch_from_refs(refs: RefSnapshot) -> Optional[str]:
+    """Return the default branch recorded in a ref snapshot (see
+    get_default_branch)."""
+    ref_name = refs.symref("refs/remotes/origin/HEAD") or ""
+    if ref_name.startswith("refs/remotes/origin/"):
+        return ref_name[len("refs/remotes/origin/") :]
+    return refs.head_branch()
+
+
+def remote_head_symref(branch: str, mirror: bool) -> Tuple[str, str]:
+    """Return the symref caching the remote default branch and its target."""
+    if mirror:
+        return "HEAD", f"refs/heads/{branch}"
+    return "refs/remotes/origin/HEAD", f"refs/remotes/origin/{branch}"
+
+
+def update_remote_head(
+    git_repo: Repo, branch: str, mirror: bool, refs: Optional[RefSnapshot] = None
+) -> bool:
+    """Point the cached remote HEAD symref at ``branch``.
+
+    Returns True if the symref changed.
+    """
+    symref, target = remote_head_symref(branch, mirror)
+    refs = refs or RefSnapshot.read(git_repo.git_dir)
+    if refs.symref(symref) == target:
+        return False
+    git_repo.git.symbolic_ref(symref, target)
+    return True
 
 
 def clean_untracked_files(git_repo: Repo, logger: logging.Logger) -> None:
@@ -124,36 +570,46 @@ def clean_untracked_files(git_repo: Repo, logger: logging.Logger) -> None:
         logger.error(f"Error cleaning untracked files: {str(e)}")
 
 
-def create_local_branches(git_repo: Repo, logger: logging.Logger) -> List[str]:
-    """Create local tracking branches for all remote branches."""
+def create_local_branches(
+    git_repo: Repo,
+    logger: logging.Logger,
+    force: bool = False,
+    refs: Optional[RefSnapshot] = None,
+) -> List[str]:
+    """Create local tracking branches for all remote branches.
+
+    No network operation is performed: the remote references fetched by
+    fetch_repository are used and existing branches are updated by merging
+    their remote tracking branch. With ``force`` (used for shallow history,
+    where merges cannot see past the shallow boundary) existing branches are
+    reset to their remote tracking branch instead.
+    """
     processed_branches = []
     try:
-        remote = git_repo.remote()
-        logger.info("Fetching all remote references...")
-        remote.fetch()
-        remote.fetch(tags=True)
-        logger.info("Remote references fetched successfully")
+        refs = refs or RefSnapshot.read(git_repo.git_dir)
 
         # Get all remote branches
-        remote_branches = [ref for ref in remote.refs if ref.name != "origin/HEAD"]
+        remote_branches = sorted(refs.with_prefix("refs/remotes/origin/"))
         logger.info(f"Found {len(remote_branches)} remote branches")
 
         # Create local tracking branches for all remote branches
-        for ref in remote_branches:
-            branch_name = ref.name.replace("origin/", "")
+        existing_branches = set(refs.branches())
+        for branch_name in remote_branches:
+            ref_name = f"origin/{branch_name}"
             try:
-                # Check if local branch already exists
-                existing_branches = [b.name for b in git_repo.branches]
-
                 if branch_name not in existing_branches:
                     logger.info(f"Creating local branch: {branch_name}")
-                    git_repo.git.checkout("-b", branch_name, ref.name)
+                    git_repo.git.checkout("-b", branch_name, ref_name)
+                    existing_branches.add(branch_name)
                     processed_branches.append(f"{branch_name} (new)")
                 else:
                     logger.info(f"Updating existing branch: {branch_name}")
                     clean_untracked_files(git_repo, logger)
-                    git_repo.git.checkout(branch_name)
-                    git_repo.git.pull("origin", branch_name)
+                    if force:
+                        git_repo.git.checkout("-B", branch_name, ref_name)
+                    else:
+                        git_repo.git.checkout(branch_name)
+                        git_repo.git.merge(ref_name)
                     processed_branches.append(f"{branch_name} (updated)")
 
             except Exception as e:
@@ -175,66 +631,1045 @@ def create_local_branches(git_repo: Repo, logger: logging.Logger) -> List[str]:
         return processed_branches
 
 
-def process_repository(
-    github_client: Github, repo_url: str, output_dir: str, logger: logging.Logger
-) -> None:
-    """Process a repository: download if it doesn't exist or update if it already
-    exists."""
+def update_local_branch_refs(
+    git_repo: Repo,
+    logger: logging.Logger,
+    force: bool = False,
+    refs: Optional[RefSnapshot] = None,
+) -> List[str]:
+    """Create and fast-forward local branches without touching the working tree.
+
+    All branch changes are applied in a single ``git update-ref --stdin``
+    transaction. If the transaction is rejected (e.g. a new ``feature/a``
+    conflicts with a local ``feature`` branch) the changes are applied one by
+    one instead, so only the conflicting branches fail. Branches that have
+    diverged from origin are left untouched and reported as failed, unless
+    ``force`` is set (shallow history) in which case they are moved to the
+    remote tip. If the checked-out branch moved, HEAD is then detached at its
+    old commit so the working tree is only updated by the final default-branch
+    checkout.
+    """
+    processed_branches = []
     try:
-        repo_name = get_repo_name_from_url(repo_url)
-        repo_dir = os.path.join(output_dir, repo_name.replace("/", "_"))
+        refs = refs or RefSnapshot.read(git_repo.git_dir)
+        local_refs = refs.with_prefix("refs/heads/")
+        remote_refs = refs.with_prefix("refs/remotes/origin/")
+        logger.info(f"Found {len(remote_refs)} remote branches")
+
+        # Branch name -> (update-ref command, status once applied)
+        commands = {}
+        statuses = {}
+        for branch_name, remote_sha in sorted(remote_refs.items()):
+            local_sha = local_refs.get(branch_name)
+            if local_sha is None:
+                commands[branch_name] = (
+                    f"create refs/heads/{branch_name} {remote_sha}",
+                    "new",
+                )
+            elif local_sha == remote_sha:
+                statuses[branch_name] = "unchanged"
+            elif force or git_repo.is_ancestor(local_sha, remote_sha):
+                commands[branch_name] = (
+                    f"update refs/heads/{branch_name} {remote_sha} {local_sha}",
+                    "updated",
+                )
+            else:
+                logger.error(f"Branch {branch_name} has diverged from origin")
+                statuses[branch_name] = "failed"
+
+        if commands:
+            logger.info(f"Applying {len(commands)} branch updates in one batch...")
+            try:
+                run_ref_updates(git_repo, [c for c, _ in commands.values()])
+                applied = list(commands)
+            except GitCommandError as e:
+                logger.warning(
+                    f"Batch branch update rejected, applying branches one by one: "
+                    f"{str(e)}"
+                )
+                applied = []
+                for branch_name, (command, _) in commands.items():
+                    try:
+                        run_ref_updates(git_repo, [command])
+                        applied.append(branch_name)
+                    except GitCommandError as e:
+                        logger.error(f"Cannot update branch {branch_name}: {str(e)}")
+
+            for branch_name in commands:
+                statuses[branch_name] = (
+                    commands[branch_name][1] if branch_name in applied else "failed"
+                )
+
+            head_branch = refs.head_branch()
+            if head_branch in applied:
+                # Keep the working tree's commit checked out until the final
+                # checkout of the default branch
+                git_repo.git.update_ref("--no-deref", "HEAD", local_refs[head_branch])
+
+            with git_repo.config_writer() as config:
+                for branch_name in applied:
+                    if commands[branch_name][1] != "new":
+                        continue
+                    section = f'branch "{branch_name}"'
+                    config.set_value(section, "remote", "origin")
+                    config.set_value(section, "merge", f"refs/heads/{branch_name}")
+
+        processed_branches = [
+            f"{branch_name} ({status})"
+            for branch_name, status in sorted(statuses.items())
+        ]
+        logger.info("All branches processed for offline access")
 
-        logger.info(f"{'='*60}")
-        logger.info(f"Processing repository: {repo_name}")
-        logger.info(f"Repository URL: {repo_url}")
-        logger.info(f"Local directory: {repo_dir}")
+        if processed_branches:
+            logger.info(f"Branches processed ({len(processed_branches)} total):")
+            for branch in processed_branches:
+                logger.info(f"  - {branch}")
+
+        return processed_branches
+
+    except Exception as e:
+        logger.error(f"Error in update_local_branch_refs: {str(e)}")
+        return processed_branches
+
+
+def run_ref_updates(git_repo: Repo, commands: List[str]) -> None:
+    """Apply ``git update-ref --stdin`` commands in a single transaction."""
+    with tempfile.TemporaryFile() as batch:
+        batch.write("".join(f"{c}\n" for c in commands).encode("utf-8"))
+        batch.seek(0)
+        git_repo.git.update_ref("--stdin", istream=batch)
+
+
+def parse_ls_remote(ls_remote_output: str) -> Tuple[Dict[str, str], Optional[str]]:
+    """Parse ``git ls-remote`` output into branch and tag refs and the default
+    branch named by the ``HEAD`` symref line, if advertised."""
+    remote_refs, default_branch = {}, None
+    for line in ls_remote_output.splitlines():
+        value, ref_name = line.split("\t", 1)
+        if value.startswith("ref: ") and ref_name == "HEAD":
+            target = value[len("ref: ") :]
+            if target.startswith("refs/heads/"):
+                default_branch = target[len("refs/heads/") :]
+        elif ref_name.startswith(("refs/heads/", "refs/tags/")) and not (
+            ref_name.endswith("^{}")
+        ):
+            remote_refs[ref_name] = value
+    return remote_refs, default_branch
+
+
+def refs_unchanged(
+    ls_remote_output: str,
+    local_refs: Dict[str, str],
+    mirror: bool,
+    ref_filter: Optional[RefFilter] = None,
+) -> bool:
+    """Return True if the remote branches and tags match the local refs.
+
+    ``ls_remote_output`` is the output of ``git ls-remote`` and ``local_refs``
+    maps local ref names to object ids (RefSnapshot.refs); only refs/heads,
+    refs/remotes/origin and refs/tags are compared. Outside mirror mode both the remote
+    tracking branches and the local branches must match the remote heads.
+    Remote refs excluded by ``ref_filter`` are ignored.
+    """
+    remote_refs, _ = parse_ls_remote(ls_remote_output)
+    if ref_filter is not None:
+        remote_refs = {
+            ref: sha for ref, sha in remote_refs.items() if ref_filter.matches(ref)
+        }
+
+    local_heads, tracking_heads, local_tags = {}, {}, {}
+    for ref_name, sha in local_refs.items():
+        if ref_name.startswith("refs/heads/"):
+            local_heads[ref_name] = sha
+        elif ref_name.startswith("refs/tags/"):
+            local_tags[ref_name] = sha
+        elif ref_name.startswith("refs/remotes/origin/") and (
+            ref_name != "refs/remotes/origin/HEAD"
+        ):
+            branch_name = ref_name[len("refs/remotes/origin/") :]
+            tracking_heads[f"refs/heads/{branch_name}"] = sha
+
+    if mirror:
+        return remote_refs == {**local_heads, **local_tags}
+
+    remote_heads = {
+        ref: sha for ref, sha in remote_refs.items() if ref.startswith("refs/heads/")
+    }
+    return remote_refs == {**tracking_heads, **local_tags} and all(
+        local_heads.get(ref) == sha for ref, sha in remote_heads.items()
+    )
+
+
+def repository_unchanged(
+    git_repo: Repo,
+    ls_remote_output: str,
+    mirror: bool,
+    default_branch: Optional[str],
+    ref_filter: Optional[RefFilter] = None,
+) -> bool:
+    """Check with the output of a single ls-remote (LS_REMOTE_ARGS) whether a
+    fetch would change anything.
+
+    A remote HEAD symref not pointing at ``default_branch`` counts as a change.
+    """
+    refs = RefSnapshot.read(git_repo.git_dir)
+    if default_branch:
+        symref, target = remote_head_symref(default_branch, mirror)
+        if refs.symref(symref) != target:
+            return False
+    return refs_unchanged(ls_remote_output, refs.refs, mirror, ref_filter)
+
+
+def configure_ref_filter(git_repo: Repo, ref_filter: RefFilter, mirror: bool) -> bool:
+    """Write the fetch refspecs for ``ref_filter`` to the origin remote, or the
+    default refspec when no rules apply.
+
+    Returns True if the configuration changed.
+    """
+    if ref_filter.active:
+        branch_prefix = "refs/heads/" if mirror else "refs/remotes/origin/"
+        refspecs = ref_filter.refspecs(branch_prefix, "refs/tags/")
+    elif mirror:
+        refspecs = ["+refs/*:refs/*"]
+    else:
+        refspecs = ["+refs/heads/*:refs/remotes/origin/*"]
 
-        if os.path.exists(repo_dir):
-            logger.info(f"Repository exists locally - UPDATING {repo_name}")
-            git_repo = Repo(repo_dir)
+    try:
+        current = git_repo.git.config("--get-all", "remote.origin.fetch").splitlines()
+    except GitCommandError:
+        current = []
+    if current == refspecs:
+        return False
+
+    if current:
+        git_repo.git.config("--unset-all", "remote.origin.fetch")
+    for refspec in refspecs:
+        git_repo.git.config("--add", "remote.origin.fetch", refspec)
+    if ref_filter.active:
+        # Tags are fetched through the refspecs, automatic tag following would
+        # bring back excluded tags
+        git_repo.git.config("remote.origin.tagOpt", "--no-tags")
+    else:
+        try:
+            git_repo.git.config("--unset", "remote.origin.tagOpt")
+        except GitCommandError:
+            pass
+    return True
+
+
+def prune_filtered_refs(git_repo: Repo, ref_filter: RefFilter, mirror: bool) -> int:
+    """Delete remote tracking branches (branches in mirrors) and tags that the
+    branch/tag rules exclude, e.g. left over from before the rules existed.
+
+    ``git fetch --prune`` keeps them because excluded refs are never fetched.
+    Returns the number of deleted refs.
+    """
+    if not ref_filter.active:
+        return 0
+
+    branch_prefix = "refs/heads/" if mirror else "refs/remotes/origin/"
+    refs = RefSnapshot.read(git_repo.git_dir)
+    excluded = [
+        f"{branch_prefix}{name}"
+        for name in sorted(refs.with_prefix(branch_prefix))
+        if not ref_filter.matches(f"refs/heads/{name}")
+    ] + [
+        f"refs/tags/{name}"
+        for name in sorted(refs.with_prefix("refs/tags/"))
+        if not ref_filter.matches(f"refs/tags/{name}")
+    ]
+
+    delete_refs(git_repo, excluded)
+    return len(excluded)
+
+
+def delete_refs(git_repo: Repo, ref_names: List[str]) -> None:
+    """Delete refs in a single ``git update-ref --stdin`` transaction."""
+    if ref_names:
+        run_ref_updates(git_repo, [f"delete {ref}" for ref in ref_names])
+
+
+def get_seed_bundle(bundle_dir: Optional[str], repo_dir: str) -> Optional[str]:
+    """Return the bundle in ``bundle_dir`` for ``repo_dir``, if there is one."""
+    if not bundle_dir:
+        return None
+    bundle_path = os.path.join(
+        bundle_dir, f"{os.path.basename(os.path.normpath(repo_dir))}{BUNDLE_SUFFIX}"
+    )
+    return os.path.abspath(bundle_path) if os.path.isfile(bundle_path) else None
 
-            # Ensure all branches are available locally for offline access
-            create_local_branches(git_repo, logger)
 
-            # Checkout default branch
-            default_branch = get_default_branch(git_repo)
-            if default_branch:
-                logger.info(f"Checking out default branch: {default_branch}")
-                clean_untracked_files(git_repo, logger)
-                git_repo.git.checkout(default_branch)
+def fetch_remote_refs(
+    git_repo: Repo,
+    logger: logging.Logger,
+    options: SyncOptions,
+    ref_filter: RefFilter,
+) -> None:
+    """Fetch all wanted branches and tags from origin in a single fetch that
+    also prunes deleted branches."""
+    logger.info("Fetching all remote references...")
+    if options.mirror:
+        git_repo.git.execute(["git", *options.mirror_update_args()])
+    elif ref_filter.active:
+        # The configured refspecs select the tags to fetch
+        git_repo.git.fetch("--prune", *options.history_args(), "origin")
+    else:
+        git_repo.git.fetch("--prune", "--tags", *options.history_args(), "origin")
+    logger.info("Remote references fetched successfully")
+
+    pruned = prune_filtered_refs(git_repo, ref_filter, options.mirror)
+    if pruned:
+        logger.info(f"Removed {pruned} refs excluded by the branch/tag rules")
+
+
+def update_object_pool(
+    repo_url: str,
+    logger: logging.Logger,
+    options: SyncOptions,
+    ref_filter: Optional[RefFilter] = None,
+) -> str:
+    """Fetch the repository into the object pool of its fork network, so the
+    clone or fetch that follows only transfers objects the pool lacks.
+
+    Returns the pool repository directory.
+    """
+    repo_slug = get_repo_slug(repo_url)
+    network = options.fork_networks.get(repo_slug, repo_slug)
+    logger.info(f"Updating shared object pool of fork network {network}...")
+    pool_dir = options.object_pool.update(network, repo_url, repo_slug, ref_filter)
+    logger.info("Object pool updated")
+    return pool_dir
+
+
+def fetch_repository(
+    repo_url: str,
+    output_dir: str,
+    logger: logging.Logger,
+    options: Optional[SyncOptions] = None,
+) -> Optional[Repo]:
+    """Network stage: clone the repository if it is missing, otherwise update it
+    with a single fetch of all branches and tags that also prunes deleted
+    branches.
+
+    In mirror mode the repository is cloned with ``--mirror`` and updated with
+    a single ``git remote update --prune``. With ``skip_unchanged`` an existing
+    repository whose refs already match the remote is not fetched and None is
+    returned. With an object pool, objects are first fetched into the pool
+    shared by the repository's fork network and borrowed through alternates.
+    Branch and tag rules limit the fetched refs through the remote refspecs;
+    the default branch is always kept.
+    """
+    options = options or SyncOptions()
+    repo_name = get_repo_name_from_url(repo_url)
+    repo_slug = get_repo_slug(repo_url)
+    ref_filter = options.ref_filter_for(repo_slug)
+    repo_dir = os.path.join(output_dir, repo_name.replace("/", "_"))
+
+    logger.info(f"{'='*60}")
+    logger.info(f"Processing repository: {repo_name}")
+    logger.info(f"Repository URL: {repo_url}")
+    logger.info(f"Local directory: {repo_dir}")
+
+    if os.path.exists(repo_dir):
+        logger.info(f"Repository exists locally - UPDATING {repo_name}")
+        git_repo = Repo(repo_dir)
+        if git_repo.bare != options.mirror:
+            raise ValueError(
+                f"{repo_dir} is {'a bare' if git_repo.bare else 'not a bare'} "
+                "repository; use --clean or another --output to switch modes"
+            )
 
+        # A fetch does not update the remote HEAD symref, so ask the remote
+        # for its default branch; --skip-unchanged's ls-remote includes it
+        ls_remote_output = git_repo.git.ls_remote(
+            *(LS_REMOTE_ARGS if options.skip_unchanged else LS_REMOTE_HEAD_ARGS)
+        )
+        _, default_branch = parse_ls_remote(ls_remote_output)
+        if default_branch:
+            options.default_branches[repo_slug] = default_branch
         else:
-            logger.info(f"Repository not found locally - DOWNLOADING {repo_name}")
-            os.makedirs(repo_dir, exist_ok=True)
+            default_branch = options.default_branches.get(
+                repo_slug
+            ) or get_default_branch(git_repo)
+
+        ref_filter = ref_filter.with_default_branch(default_branch)
+        filter_changed = configure_ref_filter(git_repo, ref_filter, options.mirror)
+        if filter_changed:
+            logger.info("Branch/tag rules changed - updated fetch refspecs")
+
+        if (
+            options.skip_unchanged
+            and not filter_changed
+            and repository_unchanged(
+                git_repo, ls_remote_output, options.mirror, default_branch, ref_filter
+            )
+        ):
+            logger.info("Remote branches and tags unchanged - skipping repository")
+            options.stats.increment("unchanged")
+            return None
 
+        if options.object_pool:
+            pool_dir = update_object_pool(repo_url, logger, options, ref_filter)
+            if link_object_pool(git_repo, pool_dir):
+                # Drop the private copies of objects the pool now provides
+                logger.info("Repacking to drop objects borrowed from the pool...")
+                git_repo.git.repack("-a", "-d", "-l")
+
+        fetch_remote_refs(git_repo, logger, options, ref_filter)
+
+        if default_branch and update_remote_head(
+            git_repo, default_branch, options.mirror
+        ):
+            logger.info(f"Remote default branch changed to {default_branch}")
+    else:
+        logger.info(f"Repository not found locally - DOWNLOADING {repo_name}")
+        os.makedirs(repo_dir, exist_ok=True)
+
+        if options.mirror:
+            logger.info("Cloning repository as bare mirror...")
+        else:
             logger.info("Cloning repository...")
-            Repo.clone_from(repo_url, repo_dir)
-            logger.info("Repository cloned successfully")
+        if options.clone_filter:
+            logger.info(f"Using partial clone filter: {options.clone_filter}")
+        sparse_directories = options.sparse_checkout_for(repo_slug)
+        clone_args = options.clone_args(
+            filtered=ref_filter.active, sparse=bool(sparse_directories)
+        )
+        if options.object_pool:
+            pool_dir = update_object_pool(
+                repo_url,
+                logger,
+                options,
+                ref_filter.with_default_branch(options.default_branches.get(repo_slug)),
+            )
+            clone_args.append(f"--reference={pool_dir}")
+        bundle_path = get_seed_bundle(options.bundle_dir, repo_dir)
+        if bundle_path:
+            # git unbundles it first and then only fetches what it lacks
+            logger.info(f"Seeding clone from bundle {bundle_path}")
+            clone_args.append(f"--bundle-uri={bundle_path}")
+        git_repo = Repo.clone_from(repo_url, repo_dir, multi_options=clone_args)
+        logger.info("Repository cloned successfully")
+
+        refs = RefSnapshot.read(git_repo.git_dir)
+        if bundle_path:
+            # The bundle's refs/bundles/* were only needed for the negotiation
+            delete_refs(
+                git_repo,
+                [f"refs/bundles/{name}" for name in refs.with_prefix("refs/bundles/")],
+            )
+
+        # The clone recorded the remote HEAD, cache it for later runs. Fetching
+        # and deleting the bundle refs leave that symref alone
+        default_branch = get_default_branch(git_repo, refs)
+        if default_branch:
+            options.default_branches[repo_slug] = default_branch
+
+        if ref_filter.active:
+            # Only the default branch was cloned, fetch the refs the rules
+            # select. The default branch is checked out, so it is always kept
+            ref_filter = ref_filter.with_default_branch(default_branch)
+            configure_ref_filter(git_repo, ref_filter, options.mirror)
+            fetch_remote_refs(git_repo, logger, options, ref_filter)
 
-            git_repo = Repo(repo_dir)
+    return git_repo
 
-            # Create local branches for all remote branches for offline access
-            create_local_branches(git_repo, logger)
 
-            # Checkout default branch
-            default_branch = get_default_branch(git_repo)
-            if default_branch:
-                logger.info(f"Checking out default branch: {default_branch}")
-                clean_untracked_files(git_repo, logger)
-                git_repo.git.checkout(default_branch)
+def configure_sparse_checkout(
+    git_repo: Repo, directories: List[str], logger: logging.Logger
+) -> None:
+    """Restrict the working tree to ``directories`` (cone mode), or restore the
+    full tree when the list is empty. Nothing is done if already configured."""
+    # git keeps this setting in config.worktree, which GitPython does not read
+    try:
+        enabled = git_repo.git.config("--type=bool", "core.sparseCheckout") == "true"
+    except GitCommandError:
+        enabled = False
+
+    if directories:
+        directories = sorted(directory.strip("/") for directory in directories)
+        current = git_repo.git.sparse_checkout("list").splitlines() if enabled else []
+        if not enabled or sorted(current) != directories:
+            logger.info(f"Setting sparse checkout to: {', '.join(directories)}")
+            git_repo.git.sparse_checkout("set", "--cone", *directories)
+    elif enabled:
+        logger.info("Disabling sparse checkout, restoring the full working tree")
+        git_repo.git.sparse_checkout("disable")
+
+
+def materialize_repository(
+    git_repo: Repo,
+    repo_url: str,
+    logger: logging.Logger,
+    options: Optional[SyncOptions] = None,
+) -> None:
+    """Local stage: create local branches, check out the default branch and log
+    the summary, using only the references fetched by fetch_repository.
+
+    Repositories with sparse checkout directories only ever check out those
+    directories (plus top-level files).
+    """
+    options = options or SyncOptions()
+    repo_name = get_repo_name_from_url(repo_url)
+
+    if not options.mirror:
+        configure_sparse_checkout(
+            git_repo, options.sparse_checkout_for(get_repo_slug(repo_url)), logger
+        )
+
+    # One snapshot of the fetched refs serves all branch decisions below;
+    # creating local branches leaves the remote HEAD symref unchanged
+    refs = RefSnapshot.read(git_repo.git_dir)
+
+    # Ensure all branches are available locally for offline access
+    if options.mirror:
+        # A mirror already holds every branch and tag as local refs
+        default_branch = None
+    elif options.ref_only:
+        update_local_branch_refs(git_repo, logger, force=options.shallow, refs=refs)
+        # HEAD may have been detached to move the checked-out branch; the
+        # snapshot still names that branch as the fallback to return to
+        default_branch = get_default_branch(git_repo, refs)
+    else:
+        create_local_branches(git_repo, logger, force=options.shallow, refs=refs)
+        default_branch = get_default_branch(git_repo, refs)
+
+    # Checkout default branch
+    if default_branch:
+        logger.info(f"Checking out default branch: {default_branch}")
+        clean_untracked_files(git_repo, logger)
+        if os.path.exists(os.path.join(git_repo.git_dir, "index")):
+            git_repo.git.checkout(default_branch)
+        else:
+            # A --no-checkout clone: HEAD already names the branch, but
+            # nothing has been checked out yet
+            git_repo.git.checkout("--force", default_branch)
 
-        # Get final list of all local branches for summary
-        all_branches = [branch.name for branch in git_repo.branches]
-        logger.info(f"Repository {repo_name} - Final branch summary:")
-        logger.info(f"  Total local branches: {len(all_branches)}")
-        logger.info(f"  Branch names: {', '.join(sorted(all_branches))}")
+    # Get final list of all local branches for summary
+    all_branches = RefSnapshot.read(git_repo.git_dir).branches()
+    logger.info(f"Repository {repo_name} - Final branch summary:")
+    logger.info(f"  Total local branches: {len(all_branches)}")
+    logger.info(f"  Branch names: {', '.join(sorted(all_branches))}")
 
-        logger.info(f"✅ Repository {repo_name} processed successfully")
-        logger.info("Repository ready for offline use with all branches")
+    logger.info(f"✅ Repository {repo_name} processed successfully")
+    logger.info("Repository ready for offline use with all branches")
+
+    if options.maintenance:
+        options.maintenance.schedule(git_repo.git_dir, logger)
+
+
+def process_repository(
+    github_client: GitHubApi,
+    repo_url: str,
+    output_dir: str,
+    logger: logging.Logger,
+    options: Optional[SyncOptions] = None,
+) -> Optional[Exception]:
+    """Process a repository: download if it doesn't exist or update if it already
+    exists.
+
+    Returns the error that stopped processing, or None on success.
+    """
+    try:
+        git_repo = fetch_repository(repo_url, output_dir, logger, options)
+        if git_repo is not None:
+            materialize_repository(git_repo, repo_url, logger, options)
+        return None
 
     except Exception as e:
         logger.error(f"❌ Error processing {repo_url}: {str(e)}")
         # Don't stop the script, continue with the next repo
+        return e
+
+
+def load_run_state(output_dir: str, logger: logging.Logger) -> Dict[str, Any]:
+    """Load the state recorded by previous runs in the output directory."""
+    state_path = os.path.join(output_dir, STATE_FILENAME)
+    try:
+        with open(state_path, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"repos": {}}
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable state file {state_path}: {str(e)}")
+        return {"repos": {}}
+
+
+def save_run_state(
+    output_dir: str,
+    state: Dict[str, Any],
+    logger: logging.Logger,
+    loaded: Optional[Dict[str, Any]] = None,
+) -> None:
+    """Persist run state to the output directory.
+
+    Several processes (e.g. --queue workers) may share an output directory, so
+    the state file is read again under a lock and only the per-repository
+    values that differ from ``loaded``, the state this process started from,
+    are written over it. Without ``loaded`` every value of ``state`` is.
+    """
+    state_path = os.path.join(output_dir, STATE_FILENAME)
+    loaded_repos = (loaded or {}).get("repos", {})
+    try:
+        with open(f"{state_path}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            current = load_run_state(output_dir, logger)
+            current_repos = current.setdefault("repos", {})
+            for slug, entry in state.get("repos", {}).items():
+                previous = loaded_repos.get(slug, {})
+                changed = {
+                    key: value
+                    for key, value in entry.items()
+                    if key not in previous or previous[key] != value
+                }
+                if changed:
+                    current_repos.setdefault(slug, {}).update(changed)
+
+            tmp_path = f"{state_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(current, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, state_path)
+    except Exception as e:
+        logger.error(f"Error saving state file {state_path}: {str(e)}")
+
+
+def get_repo_metadata(
+    github_client: GitHubApi, repo_url: str
+) -> Optional[Dict[str, Any]]:
+    """Return the repository size in KB, default branch and fork network (the
+    root repository of its forks) reported by the GitHub API."""
+    if "github.com" not in repo_url:
+        return None
+    try:
+        github_repo, _ = github_client.get(f"/repos/{get_repo_slug(repo_url)}")
+        root = github_repo["source"] if github_repo["fork"] else github_repo
+        return {
+            "size": github_repo["size"],
+            "default_branch": github_repo["default_branch"],
+            "network": root["full_name"].lower(),
+        }
+    except Exception:
+        return None
+
+
+def lookup_repo_metadata(
+    github_client: GitHubApi,
+    repos: List[str],
+    repo_state: Dict[str, Dict[str, Any]],
+    jobs: int,
+) -> None:
+    """Look up GitHub API metadata of ``repos`` concurrently and store it in
+    ``repo_state`` by slug."""
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        metadata = executor.map(
+            lambda url: get_repo_metadata(github_client, url), repos
+        )
+        for repo, repo_metadata in zip(repos, metadata):
+            if repo_metadata is not None:
+                repo_state.setdefault(get_repo_slug(repo), {}).update(repo_metadata)
+
+
+def estimate_repo_costs(
+    repos: List[str], repo_state: Dict[str, Dict[str, Any]]
+) -> Dict[str, float]:
+    """Estimate the processing cost of each repository in seconds.
+
+    Durations recorded on previous runs are used as they are. Repositories
+    without a recorded duration are estimated from their size using the median
+    seconds-per-KB of repositories that have both; without any such history the
+    size itself is used as the cost. Unknown repositories cost 0.
+    """
+    rates = sorted(
+        entry["duration"] / entry["size"]
+        for entry in repo_state.values()
+        if entry.get("duration") is not None and entry.get("size")
+    )
+    seconds_per_kb = rates[len(rates) // 2] if rates else 1.0
+
+    costs = {}
+    for repo in repos:
+        entry = repo_state.get(get_repo_slug(repo), {})
+        if entry.get("duration") is not None:
+            costs[repo] = entry["duration"]
+        elif entry.get("size") is not None:
+            costs[repo] = entry["size"] * seconds_per_kb
+        else:
+            costs[repo] = 0.0
+    return costs
+
+
+def order_longest_first(
+    github_client: GitHubApi,
+    repos: List[str],
+    state: Dict[str, Any],
+    jobs: int,
+    logger: logging.Logger,
+) -> List[str]:
+    """Sort repositories by expected cost, most expensive first.
+
+    Sizes are looked up through the GitHub API only for repositories that have
+    neither a recorded duration nor a known size, and are stored in ``state``
+    together with the default branch from the same response.
+    """
+    repo_state = state.setdefault("repos", {})
+    unknown = [
+        repo
+        for repo in repos
+        if not {"duration", "size"} & repo_state.get(get_repo_slug(repo), {}).keys()
+    ]
+    if unknown:
+        logger.info(f"Looking up size of {len(unknown)} repositories...")
+        lookup_repo_metadata(github_client, unknown, repo_state, jobs)
+
+    costs = estimate_repo_costs(repos, repo_state)
+    ordered = sorted(repos, key=lambda repo: costs[repo], reverse=True)
+    logger.info("Repositories ordered longest first by expected cost")
+    return ordered
+
+
+def resolve_fork_networks(
+    github_client: GitHubApi,
+    repos: List[str],
+    state: Dict[str, Any],
+    jobs: int,
+    logger: logging.Logger,
+) -> Dict[str, str]:
+    """Return the fork network of each repository slug.
+
+    Networks are looked up through the GitHub API once and cached in
+    ``state``. Repositories outside GitHub form a network of their own.
+    """
+    repo_state = state.setdefault("repos", {})
+    unknown = [
+        repo
+        for repo in repos
+        if "network" not in repo_state.get(get_repo_slug(repo), {})
+    ]
+    if unknown:
+        logger.info(f"Looking up fork network of {len(unknown)} repositories...")
+        lookup_repo_metadata(github_client, unknown, repo_state, jobs)
+
+    networks = {}
+    for repo in repos:
+        slug = get_repo_slug(repo)
+        networks[slug] = repo_state.get(slug, {}).get("network", slug.lower())
+    logger.info(
+        f"{len(networks)} repositories belong to "
+        f"{len(set(networks.values()))} fork networks"
+    )
+    return networks
+
+
+def apply_repo_metadata(
+    repos: List[str],
+    metadata: Dict[str, Dict[str, Any]],
+    state: Dict[str, Any],
+) -> int:
+    """Store the size, default branch and fork network of ``repos`` from
+    ``metadata`` (keyed by lowercased slug) in ``state``, replacing older values.
+
+    Returns the number of repositories with metadata.
+    """
+    repo_state = state.setdefault("repos", {})
+    applied = 0
+    for repo in repos:
+        slug = get_repo_slug(repo)
+        entry = metadata.get(slug.lower())
+        if entry is None:
+            continue
+        repo_state.setdefault(slug, {}).update(
+            {
+                key: entry[key]
+                for key in REPO_METADATA_KEYS
+                if entry.get(key) is not None
+            }
+        )
+        applied += 1
+    return applied
+
+
+def load_default_branches(state: Dict[str, Any]) -> Dict[str, str]:
+    """Return the default branches cached in ``state`` by repository slug."""
+    return {
+        slug: entry["default_branch"]
+        for slug, entry in state.get("repos", {}).items()
+        if entry.get("default_branch")
+    }
+
+
+def record_default_branches(
+    state: Dict[str, Any], default_branches: Dict[str, str]
+) -> None:
+    """Cache per-repository default branches in ``state``."""
+    repo_state = state.setdefault("repos", {})
+    for slug, branch in default_branches.items():
+        repo_state.setdefault(slug, {})["default_branch"] = branch
+
+
+def record_durations(state: Dict[str, Any], durations: Dict[str, float]) -> None:
+    """Store per-repository processing durations in ``state``."""
+    repo_state = state.setdefault("repos", {})
+    for repo_url, duration in durations.items():
+        repo_state.setdefault(get_repo_slug(repo_url), {})["duration"] = round(
+            duration, 3
+        )
+
+
+def run_repositories(
+    github_client: GitHubApi,
+    repos: List[str],
+    output_dir: str,
+    jobs: int,
+    logger: logging.Logger,
+    adaptive: bool = False,
+    options: Optional[SyncOptions] = None,
+) -> Dict[str, float]:
+    """Process all repositories with a pool of ``jobs`` workers.
+
+    Each worker logs through its own repository-prefixed adapter so interleaved
+    lines stay attributable, and a single progress bar tracks all workers. With
+    ``adaptive`` the number of active workers is tuned at runtime by an AIMD
+    limiter, using ``jobs`` as the ceiling.
+
+    Returns the processing duration in seconds of each repository.
+    """
+    durations = {}
+
+    if jobs == 1:
+        for repo in tqdm(repos, desc="Processing repositories"):
+            started = time.monotonic()
+            process_repository(github_client, repo, output_dir, logger, options)
+            durations[repo] = time.monotonic() - started
+        return durations
+
+    limiter = None
+    if adaptive:
+        limiter = AdaptiveConcurrencyLimiter(
+            initial=max(1, jobs // 2), maximum=jobs, logger=logger
+        )
+        logger.info(
+            f"Using adaptive concurrency: starting at {limiter.limit} workers, "
+            f"up to {jobs}"
+        )
+    else:
+        logger.info(f"Using {jobs} parallel workers")
+
+    def process(repo_url: str) -> None:
+        repo_logger = RepoLoggerAdapter(logger, {"repo": get_repo_slug(repo_url)})
+        if limiter is not None:
+            limiter.acquire()
+        error = None
+        started = time.monotonic()
+        try:
+            error = process_repository(
+                github_client, repo_url, output_dir, repo_logger, options
+            )
+        finally:
+            durations[repo_url] = time.monotonic() - started
+            if limiter is not None:
+                limiter.release(error)
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(process, repo) for repo in repos]
+        with tqdm(total=len(futures), desc="Processing repositories") as progress:
+            for future in as_completed(futures):
+                future.result()
+                progress.update(1)
+
+    if limiter is not None:
+        logger.info(f"Adaptive concurrency settled at {limiter.limit} workers")
+
+    return durations
+
+
+def run_pipeline(
+    repos: List[str],
+    output_dir: str,
+    fetch_jobs: int,
+    local_jobs: int,
+    logger: logging.Logger,
+    adaptive: bool = False,
+    options: Optional[SyncOptions] = None,
+) -> Dict[str, float]:
+    """Process repositories in two stages with separate bounded queues.
+
+    ``fetch_jobs`` workers clone/fetch repositories (network) and hand them to
+    ``local_jobs`` workers that create branches and check out the default branch
+    (disk), so network and disk work overlap across repositories. New clones
+    are made without a checkout, so writing their working tree is left to the
+    local stage. With ``adaptive`` the number of active fetch workers is tuned
+    by an AIMD limiter.
+
+    Returns the processing duration in seconds of each repository.
+    """
+    options = replace(options or SyncOptions(), no_checkout=True)
+    fetch_queue: "queue.Queue[Optional[str]]" = queue.Queue(maxsize=fetch_jobs * 2)
+    local_queue: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=local_jobs * 2)
+    durations = {}
+
+    limiter = None
+    if adaptive:
+        limiter = AdaptiveConcurrencyLimiter(
+            initial=max(1, fetch_jobs // 2), maximum=fetch_jobs, logger=logger
+        )
+    logger.info(
+        f"Using pipeline with {fetch_jobs} fetch workers and "
+        f"{local_jobs} local workers"
+    )
+
+    progress = tqdm(total=len(repos), desc="Processing repositories")
+
+    def finish(repo_url: str, started: float) -> None:
+        durations[repo_url] = time.monotonic() - started
+        progress.update(1)
+
+    def fetch_worker() -> None:
+        while True:
+            repo_url = fetch_queue.get()
+            if repo_url is None:
+                return
+            repo_logger = RepoLoggerAdapter(logger, {"repo": get_repo_slug(repo_url)})
+            started = time.monotonic()
+            if limiter is not None:
+                limiter.acquire()
+            error = None
+            try:
+                git_repo = fetch_repository(repo_url, output_dir, repo_logger, options)
+            except Exception as e:
+                error = e
+                repo_logger.error(f"❌ Error processing {repo_url}: {str(e)}")
+                finish(repo_url, started)
+                continue
+            finally:
+                if limiter is not None:
+                    limiter.release(error)
+            if git_repo is None:
+                finish(repo_url, started)
+                continue
+            local_queue.put((repo_url, git_repo, started))
+
+    def local_worker() -> None:
+        while True:
+            item = local_queue.get()
+            if item is None:
+                return
+            repo_url, git_repo, started = item
+            repo_logger = RepoLoggerAdapter(logger, {"repo": get_repo_slug(repo_url)})
+            try:
+                materialize_repository(git_repo, repo_url, repo_logger, options)
+            except Exception as e:
+                repo_logger.error(f"❌ Error processing {repo_url}: {str(e)}")
+            finish(repo_url, started)
+
+    fetch_threads = [threading.Thread(target=fetch_worker) for _ in range(fetch_jobs)]
+    local_threads = [threading.Thread(target=local_worker) for _ in range(local_jobs)]
+    for thread in fetch_threads + local_threads:
+        thread.start()
+
+    for repo in repos:
+        fetch_queue.put(repo)
+    for _ in fetch_threads:
+        fetch_queue.put(None)
+    for thread in fetch_threads:
+        thread.join()
+
+    for _ in local_threads:
+        local_queue.put(None)
+    for thread in local_threads:
+        thread.join()
+    progress.close()
+
+    if limiter is not None:
+        logger.info(f"Adaptive concurrency settled at {limiter.limit} fetch workers")
+
+    return durations
+
+
+def run_queue_workers(
+    github_client: GitHubApi,
+    work_queue: WorkQueue,
+    output_dir: str,
+    jobs: int,
+    logger: logging.Logger,
+    adaptive: bool = False,
+    options: Optional[SyncOptions] = None,
+) -> Dict[str, float]:
+    """Process repositories claimed from a shared work queue.
+
+    Each of the ``jobs`` workers claims one repository at a time, keeps its
+    lease alive with a heartbeat while processing it and marks it done or
+    failed, unless the lease was lost to another worker meanwhile. Workers
+    stop when nothing is left to claim.
+
+    Returns the processing duration in seconds of each repository.
+    """
+    durations = {}
+    worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+    counts = work_queue.counts()
+    remaining = counts.get("pending", 0) + counts.get("leased", 0)
+
+    limiter = None
+    if adaptive:
+        limiter = AdaptiveConcurrencyLimiter(
+            initial=max(1, jobs // 2), maximum=jobs, logger=logger
+        )
+    logger.info(f"Using work queue {work_queue.path} with {jobs} workers")
+
+    progress = tqdm(total=remaining, desc="Processing repositories")
+
+    def worker(worker_number: int) -> None:
+        worker_id = f"{worker_prefix}:{worker_number}"
+        while True:
+            if limiter is not None:
+                limiter.acquire()
+            repo_url = work_queue.claim(worker_id)
+            if repo_url is None:
+                if limiter is not None:
+                    limiter.release()
+                return
+
+            repo_logger = RepoLoggerAdapter(logger, {"repo": get_repo_slug(repo_url)})
+            error = None
+            started = time.monotonic()
+            try:
+                with LeaseHeartbeat(
+                    work_queue, repo_url, worker_id, repo_logger
+                ) as heartbeat:
+                    error = process_repository(
+                        github_client, repo_url, output_dir, repo_logger, options
+                    )
+            finally:
+                durations[repo_url] = time.monotonic() - started
+                if limiter is not None:
+                    limiter.release(error)
+            if heartbeat.lost:
+                # The worker now holding the lease records the outcome
+                repo_logger.warning("Not marking repository done, its lease was lost")
+            else:
+                work_queue.complete(repo_url, worker_id, str(error) if error else None)
+            progress.update(1)
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for future in [executor.submit(worker, number) for number in range(jobs)]:
+            future.result()
+    progress.close()
+
+    logger.info(f"Work queue status: {work_queue.counts()}")
+    if limiter is not None:
+        logger.info(f"Adaptive concurrency settled at {limiter.limit} workers")
+
+    return durations
+
+
+def log_maintenance_summary(summary: Dict[str, int], logger: logging.Logger) -> None:
+    """Log the outcome of post-sync maintenance."""
+    logger.info(
+        f"Maintenance: {summary.get('maintained', 0)} repositories maintained, "
+        f"{summary.get('healthy', 0)} healthy, {summary.get('failed', 0)} failed"
+    )
+    for task in MAINTENANCE_COMMANDS:
+        if summary.get(task):
+            logger.info(f"  {task}: {summary[task]} repositories")
 
 
 def get_github_token(args) -> Optional[str]:
@@ -258,6 +1693,22 @@ def main() -> None:
         logger.info(f"Input file: {args.input}")
         logger.info(f"Output directory: {args.output}")
         logger.info(f"Clean mode: {args.clean}")
+        logger.info(f"Parallel jobs: {args.jobs}")
+        logger.info(f"Adaptive concurrency: {args.adaptive}")
+        logger.info(f"Longest-first scheduling: {args.longest_first}")
+        logger.info(f"Pipeline mode: {args.pipeline}")
+        logger.info(f"Ref-only branches: {args.ref_only}")
+        logger.info(f"Mirror mode: {args.mirror}")
+        logger.info(f"Skip unchanged repositories: {args.skip_unchanged}")
+        logger.info(f"Partial clone: {args.partial_clone or 'disabled'}")
+        logger.info(f"Object pool: {args.object_pool or 'disabled'}")
+        logger.info(f"Post-sync maintenance: {args.maintenance}")
+        logger.info(f"Repository metadata: {args.metadata or 'none'}")
+        logger.info(f"GitHub API rate: {args.api_rate:g} requests/s")
+        if args.depth:
+            logger.info(f"History limit: last {args.depth} commits per branch")
+        if args.shallow_since:
+            logger.info(f"History limit: commits since {args.shallow_since}")
 
         # Handle clean parameter - delete output directory if requested
         if args.clean and os.path.exists(args.output):
@@ -280,13 +1731,77 @@ def main() -> None:
         else:
             logger.warning("No GitHub token provided - API rate limits may apply")
 
-        github_client = Github(token) if token else Github()
+        github_client = GitHubApi(token, rate=args.api_rate, logger=logger)
 
         repos = read_repos_file(args.input, logger)
+        if args.shard:
+            repos = filter_shard(repos, *args.shard, logger)
+        state = load_run_state(args.output, logger)
+        loaded_state = copy.deepcopy(state)
+        if args.metadata:
+            metadata = load_repo_metadata(args.metadata, logger)
+            applied = apply_repo_metadata(repos, metadata, state)
+            logger.info(f"Applied listing metadata to {applied} repositories")
+
+        if args.longest_first:
+            repos = order_longest_first(github_client, repos, state, args.jobs, logger)
+
+        options = SyncOptions.from_args(args)
+        if args.repo_config:
+            options.repo_configs = load_repo_config(args.repo_config, logger)
+        if options.object_pool:
+            options.fork_networks = resolve_fork_networks(
+                github_client, repos, state, args.jobs, logger
+            )
+        options.default_branches = load_default_branches(state)
 
         logger.info(f"Starting processing of {len(repos)} repositories...")
-        for repo in tqdm(repos, desc="Processing repositories"):
-            process_repository(github_client, repo, args.output, logger)
+        if args.queue:
+            work_queue = WorkQueue(args.queue, lease_seconds=args.lease_seconds)
+            added = work_queue.add(repos)
+            logger.info(f"Added {added} new repositories to work queue {args.queue}")
+            durations = run_queue_workers(
+                github_client,
+                work_queue,
+                args.output,
+                args.jobs,
+                logger,
+                args.adaptive,
+                options,
+            )
+        elif args.pipeline:
+            durations = run_pipeline(
+                repos,
+                args.output,
+                args.jobs,
+                args.local_jobs,
+                logger,
+                args.adaptive,
+                options,
+            )
+        else:
+            durations = run_repositories(
+                github_client,
+                repos,
+                args.output,
+                args.jobs,
+                logger,
+                args.adaptive,
+                options,
+            )
+
+        record_durations(state, durations)
+        record_default_branches(state, options.default_branches)
+        save_run_state(args.output, state, logger, loaded_state)
+
+        if args.skip_unchanged:
+            logger.info(
+                f"Repositories skipped as unchanged: {options.stats.get('unchanged')}"
+            )
+        if options.maintenance:
+            log_maintenance_summary(options.maintenance.summary(), logger)
+        for line in github_client.describe_rate_limit():
+            logger.info(line)
 
         logger.info("=" * 60)
         logger.info(
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+
+import argparse
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from git import Repo
+from git.exc import GitCommandError
+from tqdm import tqdm
+
+from common import BUNDLE_SUFFIX, STATE_FILENAME, positive_int, setup_logging
+
+# Config set by git on partial clones (--filter), whose missing objects come
+# from the promisor remote
+PARTIAL_CLONE_KEYS = ("extensions.partialClone", "remote.origin.promisor")
+
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Export the repositories of a downloader output directory as "
+        "git bundles for seeding clones on another node (--bundle-dir)"
+    )
+    parser.add_argument(
+        "--output",
+        default="./repos",
+        help="Downloader output directory with the repositories to export",
+    )
+    parser.add_argument(
+        "--bundle-dir", required=True, help="Directory to write the bundles to"
+    )
+    parser.add_argument(
+        "--jobs",
+        type=positive_int,
+        default=1,
+        help="Number of bundles created concurrently (default: 1)",
+    )
+    return parser.parse_args()
+
+
+def find_repositories(output_dir: str) -> List[str]:
+    """Return the repository directories (working trees and bare mirrors) in
+    ``output_dir``."""
+    repo_dirs = []
+    for name in sorted(os.listdir(output_dir)):
+        path = os.path.join(output_dir, name)
+        if name == STATE_FILENAME or not os.path.isdir(path):
+            continue
+        if os.path.isdir(os.path.join(path, ".git")) or os.path.isfile(
+            os.path.join(path, "HEAD")
+        ):
+            repo_dirs.append(path)
+    return repo_dirs
+
+
+def is_partial_clone(git_repo: Repo) -> bool:
+    """Return True if objects of ``git_repo`` may be missing and fetched on
+    demand from a promisor remote."""
+    for key in PARTIAL_CLONE_KEYS:
+        try:
+            git_repo.git.config("--get", key)
+            return True
+        except GitCommandError:
+            pass
+    return False
+
+
+def export_bundle(
+    repo_dir: str, bundle_dir: str, logger: logging.Logger
+) -> Optional[Exception]:
+    """Write all branches and tags of ``repo_dir`` to a bundle named after the
+    repository directory.
+
+    Returns the error that stopped the export, or None on success.
+    """
+    name = os.path.basename(repo_dir)
+    # Absolute, since git runs inside the repository directory
+    bundle_path = os.path.abspath(os.path.join(bundle_dir, f"{name}{BUNDLE_SUFFIX}"))
+    tmp_path = f"{bundle_path}.tmp"
+    try:
+        git_repo = Repo(repo_dir)
+        if os.path.exists(os.path.join(git_repo.git_dir, "shallow")):
+            raise ValueError("shallow repositories cannot seed full clones")
+        if is_partial_clone(git_repo):
+            # git bundle create would fetch every missing object from the remote
+            raise ValueError("partial clones cannot seed full clones")
+
+        # Write to a temporary file so an interrupted export never leaves a
+        # truncated bundle behind
+        git_repo.git.bundle("create", tmp_path, "--branches", "--tags")
+        os.replace(tmp_path, bundle_path)
+        size_mb = os.path.getsize(bundle_path) / (1024 * 1024)
+        logger.info(f"✅ Exported {name} to {bundle_path} ({size_mb:.1f} MB)")
+        return None
+
+    except Exception as e:
+        logger.error(f"❌ Error exporting {name}: {str(e)}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return e
+
+
+def main() -> None:
+    """Main function of the script."""
+    logger = setup_logging("export_bundles")
+    args = parse_args()
+    logger.info(f"Source directory: {args.output}")
+    logger.info(f"Bundle directory: {args.bundle_dir}")
+
+    os.makedirs(args.bundle_dir, exist_ok=True)
+    repo_dirs = find_repositories(args.output)
+    logger.info(f"Found {len(repo_dirs)} repositories to export")
+
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        errors = list(
+            tqdm(
+                executor.map(
+                    lambda repo_dir: export_bundle(repo_dir, args.bundle_dir, logger),
+                    repo_dirs,
+                ),
+                total=len(repo_dirs),
+                desc="Exporting bundles",
+            )
+        )
+
+    failed = sum(error is not None for error in errors)
+    logger.info("=" * 60)
+    logger.info(
+        f"Export completed: {len(repo_dirs) - failed} bundles written, "
+        f"{failed} failed"
+    )
+
+
+if __name__ == "__main__":
+    main()
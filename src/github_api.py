@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+
+import glob
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+API_URL = "https://api.github.com"
+GRAPHQL_URL = f"{API_URL}/graphql"
+CACHE_SUFFIX = ".json"
+
+# Requests per second; GitHub's secondary limits allow about 900 REST points
+# (GET requests) per minute
+DEFAULT_RATE = 10.0
+# Statuses GitHub answers with when a primary or secondary limit is hit
+RATE_LIMIT_STATUSES = (403, 429)
+# GitHub asks to wait at least a minute after a secondary limit without
+# Retry-After
+SECONDARY_BACKOFF = 60.0
+MAX_RATE_LIMIT_RETRIES = 5
+# Below this share of the quota requests are spread until the reset
+QUOTA_RESERVE = 0.2
+
+
+class ResponseCache:
+    """On-disk cache of GitHub API GET responses for conditional requests.
+
+    Each entry keeps the ETag/Last-Modified validators, the Link header and the
+    JSON body of one URL, in a file named after a hash of the URL and the token
+    (responses differ per token, e.g. private repositories). An entry's age is
+    the time since it was stored or last confirmed by a 304; evict() drops
+    entries older than ``max_age`` seconds and then the oldest ones until the
+    cache fits in ``max_bytes``.
+    """
+
+    def __init__(self, path: str, max_bytes: int, max_age: float) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def _entry_path(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.path, f"{digest}{CACHE_SUFFIX}")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached entry for ``key``, or None if missing or expired."""
+        entry_path = self._entry_path(key)
+        try:
+            if time.time() - os.path.getmtime(entry_path) > self.max_age:
+                return None
+            with open(entry_path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def put(self, key: str, headers: Dict[str, str], body: Any) -> None:
+        """Store a response that carries an ETag or Last-Modified validator."""
+        entry = {
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "link": headers.get("Link"),
+            "body": body,
+        }
+        if not entry["etag"] and not entry["last_modified"]:
+            return
+        entry_path = self._entry_path(key)
+        tmp_path = f"{entry_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, entry_path)
+
+    def touch(self, key: str) -> None:
+        """Mark an entry as fresh after the server confirmed it (304)."""
+        try:
+            os.utime(self._entry_path(key))
+        except FileNotFoundError:
+            pass
+
+    def evict(self) -> Tuple[int, int]:
+        """Drop expired entries, then the oldest ones until the cache fits its
+        size bound. Returns the number of remaining and evicted entries."""
+        with self._lock:
+            now = time.time()
+            entries = []
+            for entry_path in glob.glob(os.path.join(self.path, f"*{CACHE_SUFFIX}")):
+                try:
+                    stat = os.stat(entry_path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry_path))
+
+            evicted = 0
+            total = sum(size for _, size, _ in entries)
+            # Newest first, so the oldest entries are dropped from the end
+            entries.sort(reverse=True)
+            while entries and (
+                total > self.max_bytes or now - entries[-1][0] > self.max_age
+            ):
+                _, size, entry_path = entries.pop()
+                os.remove(entry_path)
+                total -= size
+                evicted += 1
+            return len(entries), evicted
+
+
+class TokenBucket:
+    """Thread-safe token bucket releasing ``rate`` tokens per second, up to
+    ``capacity`` saved for bursts."""
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take a token, sleeping until it is available. Returns the seconds
+        waited."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            # Reserve the token now so concurrent callers queue up behind it
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+class GitHubApi:
+    """GitHub REST/GraphQL client shared by the listing and download scripts.
+
+    Requests are paced by a token bucket of ``rate`` requests per second. The
+    quota reported by the X-RateLimit headers is tracked per resource (core,
+    graphql): once it runs out, requests wait for the reset instead of failing,
+    and when under QUOTA_RESERVE of it is left they are spread evenly until the
+    reset. Secondary rate limit answers are retried after Retry-After, or with
+    an exponential backoff from one minute.
+
+    GET requests go through ``cache`` when one is given: the stored validators
+    are sent as If-None-Match/If-Modified-Since and a 304 answer, which GitHub
+    does not count against the rate limit, is served from disk. ``stats``
+    counts requests, cache hits and misses and rate limit waits.
+    """
+
+    def __init__(
+        self,
+        token: Optional[str],
+        cache: Optional[ResponseCache] = None,
+        pool_size: int = 10,
+        rate: float = DEFAULT_RATE,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        self.cache = cache
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.headers["Accept"] = "application/vnd.github+json"
+        if token:
+            self.session.headers["Authorization"] = f"bearer {token}"
+        self._token_id = hashlib.sha256((token or "").encode("utf-8")).hexdigest()
+        self.logger = logger or logging.getLogger(__name__)
+        self.rate = rate
+        self.bucket = TokenBucket(rate, capacity=max(rate, 1.0))
+        self._lock = threading.Lock()
+        # Last X-RateLimit-Limit/Remaining/Reset values by resource
+        self.rate_limits: Dict[str, Dict[str, int]] = {}
+        self.stats = {
+            "requests": 0,
+            "cache_hits": 0,
+            "cache_misses": 0,
+            "rate_limit_waits": 0,
+            "secondary_backoffs": 0,
+            "waited_seconds": 0,
+        }
+
+    def _count(self, key: str, amount: int = 1) -> None:
+        with self._lock:
+            self.stats[key] += amount
+
+    def _update_rate_limit(self, headers: Mapping[str, str]) -> None:
+        """Record the quota reported by a response and adjust the pacing."""
+        try:
+            resource = headers.get("X-RateLimit-Resource", "core")
+            quota = {
+                "limit": int(headers["X-RateLimit-Limit"]),
+                "remaining": int(headers["X-RateLimit-Remaining"]),
+                "reset": int(headers["X-RateLimit-Reset"]),
+            }
+        except (KeyError, ValueError):
+            return
+        with self._lock:
+            self.rate_limits[resource] = quota
+            rate = self.rate
+            if quota["remaining"] < quota["limit"] * QUOTA_RESERVE:
+                seconds_left = max(quota["reset"] - time.time(), 1.0)
+                rate = min(rate, max(quota["remaining"], 1) / seconds_left)
+            self.bucket.rate = rate
+
+    def _wait(self, seconds: float, reason: str) -> None:
+        self.logger.warning(f"{reason}, waiting {seconds:.0f}s")
+        self._count("waited_seconds", round(seconds))
+        time.sleep(seconds)
+
+    def _wait_for_quota(self, resource: str) -> None:
+        """Sleep until the reset if the quota of ``resource`` is used up."""
+        with self._lock:
+            quota = self.rate_limits.get(resource)
+        if quota and quota["remaining"] <= 0:
+            seconds = quota["reset"] - time.time() + 1
+            if seconds > 0:
+                self._count("rate_limit_waits")
+                self._wait(seconds, f"GitHub {resource} rate limit exhausted")
+
+    def _rate_limit_delay(
+        self, response: requests.Response, resource: str, attempt: int
+    ) -> Optional[float]:
+        """Return how long to wait before retrying a rate limited response, or
+        None if the response is not rate limited."""
+        # GraphQL reports an exhausted quota as an error in a 200 answer
+        graphql_limited = resource == "graphql" and '"RATE_LIMITED"' in response.text
+        if response.status_code not in RATE_LIMIT_STATUSES and not graphql_limited:
+            return None
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            self._count("secondary_backoffs")
+            return float(retry_after)
+        if response.headers.get("X-RateLimit-Remaining") == "0":
+            # The retry waits for the reset in _wait_for_quota
+            return 0.0
+        if graphql_limited or "secondary rate limit" in response.text.lower():
+            self._count("secondary_backoffs")
+            return SECONDARY_BACKOFF * 2**attempt
+        return None
+
+    def _request(
+        self, method: str, url: str, resource: str, **kwargs: Any
+    ) -> requests.Response:
+        """Send a paced request, retrying it after rate limit answers."""
+        for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+            self.bucket.acquire()
+            self._wait_for_quota(resource)
+            response = self.session.request(method, url, timeout=60, **kwargs)
+            self._count("requests")
+            self._update_rate_limit(response.headers)
+            delay = self._rate_limit_delay(response, resource, attempt)
+            if delay is None or attempt == MAX_RATE_LIMIT_RETRIES:
+                return response
+            if delay:
+                self._wait(delay, f"GitHub rate limited {method} {url}")
+        return response
+
+    def get(
+        self, path: str, params: Optional[Dict[str, Any]] = None
+    ) -> Tuple[Any, Mapping[str, str]]:
+        """GET ``path`` (relative to the API URL) and return the JSON body and
+        the response headers; cached responses only carry ``Link``."""
+        url = f"{API_URL}{path}"
+        full_url = requests.Request("GET", url, params=params).prepare().url
+        key = f"{self._token_id} {full_url}"
+        entry = self.cache.get(key) if self.cache else None
+        headers = {}
+        if entry:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        response = self._request("GET", url, "core", params=params, headers=headers)
+        if entry and response.status_code == 304:
+            self._count("cache_hits")
+            self.cache.touch(key)
+            return entry["body"], {"Link": entry["link"]} if entry["link"] else {}
+        response.raise_for_status()
+
+        body = response.json()
+        if self.cache:
+            self._count("cache_misses")
+            self.cache.put(key, response.headers, body)
+        return body, response.headers
+
+    def graphql(self, query: str, variables: Dict[str, Any]) -> Dict[str, Any]:
+        """Run a GraphQL query and return its ``data``, raising on errors."""
+        response = self._request(
+            "POST",
+            GRAPHQL_URL,
+            "graphql",
+            json={"query": query, "variables": variables},
+        )
+        response.raise_for_status()
+        result = response.json()
+        if result.get("errors"):
+            raise RuntimeError(
+                "; ".join(error["message"] for error in result["errors"])
+            )
+        return result["data"]
+
+    def describe_rate_limit(self) -> List[str]:
+        """Describe the request counts, waits and last known quota of each
+        resource, for the run log."""
+        with self._lock:
+            stats = dict(self.stats)
+            rate_limits = dict(self.rate_limits)
+        lines = [
+            f"API requests: {stats['requests']} ({stats['rate_limit_waits']} rate "
+            f"limit waits, {stats['secondary_backoffs']} secondary limit backoffs, "
+            f"{stats['waited_seconds']}s waited)"
+        ]
+        for resource, quota in sorted(rate_limits.items()):
+            reset = time.strftime("%H:%M:%S", time.localtime(quota["reset"]))
+            lines.append(
+                f"API quota {resource}: {quota['remaining']}/{quota['limit']} "
+                f"remaining, resets at {reset}"
+            )
+        return lines
@@ -1,14 +1,49 @@
 #!/usr/bin/env python3
 
 import argparse
+import json
 import os
 import sys
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
 
 from dotenv import load_dotenv
-from github import Github
+from requests.utils import parse_header_links
 from tqdm import tqdm
 
+from common import positive_float, positive_int
+from github_api import DEFAULT_RATE, GitHubApi, ResponseCache
+
+# Tamaño máximo de página que admite la API REST de GitHub
+MAX_PAGE_SIZE = 100
+# Fecha de la última ejecución correcta por organización
+DEFAULT_STATE_FILE = ".list_org_repos_state.json"
+
+# Una sola consulta paginada devuelve 100 repositorios con sus metadatos
+ORG_REPOS_QUERY = """
+query($org: String!, $cursor: String, $orderBy: RepositoryOrder) {
+  organization(login: $org) {
+    repositories(first: 100, after: $cursor, orderBy: $orderBy) {
+      totalCount
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        nameWithOwner
+        sshUrl
+        url
+        defaultBranchRef { name }
+        diskUsage
+        pushedAt
+        isFork
+        isArchived
+        parent { nameWithOwner isFork }
+      }
+    }
+  }
+}
+"""
+
 
 def parse_args():
     """Parsea los argumentos de línea de comandos."""
@@ -20,26 +55,250 @@ def parse_args():
         "--output", help="Archivo de salida para guardar la lista de repositorios"
     )
     parser.add_argument("--token", help="Token de acceso personal de GitHub")
-    return parser.parse_args()
+    parser.add_argument(
+        "--jobs",
+        type=positive_int,
+        default=8,
+        help="Número de páginas que se piden en paralelo (por defecto: 8)",
+    )
+    parser.add_argument(
+        "--graphql",
+        action="store_true",
+        help="Usa la API GraphQL, que devuelve 100 repositorios y sus metadatos "
+        "por consulta",
+    )
+    parser.add_argument(
+        "--metadata",
+        help="Archivo JSON donde guardar los metadatos de los repositorios para "
+        "downloader.py --metadata (requiere --graphql)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="Directorio de caché de respuestas de la API; las páginas sin cambios "
+        "se piden con ETag y no consumen límite de peticiones",
+    )
+    parser.add_argument(
+        "--cache-max-mb",
+        type=positive_int,
+        default=100,
+        help="Tamaño máximo de la caché en MB (por defecto: 100)",
+    )
+    parser.add_argument(
+        "--cache-max-age",
+        type=positive_int,
+        default=30,
+        help="Días tras los que se descarta una entrada de la caché (por defecto: 30)",
+    )
+    parser.add_argument(
+        "--api-rate",
+        type=positive_float,
+        default=DEFAULT_RATE,
+        help="Máximo de peticiones por segundo a la API; al agotar el límite se "
+        f"espera a que se renueve (por defecto: {DEFAULT_RATE:g})",
+    )
+    parser.add_argument(
+        "--changed-since-last-run",
+        action="store_true",
+        help="Lista solo los repositorios con pushes desde la última ejecución "
+        "correcta para la organización",
+    )
+    parser.add_argument(
+        "--state-file",
+        default=DEFAULT_STATE_FILE,
+        help="Archivo donde se guarda la fecha de la última ejecución correcta "
+        f"(por defecto: {DEFAULT_STATE_FILE})",
+    )
+    args = parser.parse_args()
+    if args.metadata and not args.graphql:
+        parser.error("--metadata requiere --graphql")
+    return args
+
+
+def last_page_number(headers: Mapping[str, str]) -> int:
+    """Devuelve el número de la última página según la cabecera ``Link``."""
+    for link in parse_header_links(headers.get("Link") or ""):
+        if link.get("rel") == "last":
+            return int(parse_qs(urlparse(link["url"]).query)["page"][0])
+    return 1
+
+
+def get_org_repos(api: GitHubApi, org_name: str, jobs: int = 1) -> List[str]:
+    """Obtiene la lista de repositorios de una organización.
+
+    La primera página indica en su cabecera ``Link`` cuántas hay; las restantes
+    se piden en paralelo (``jobs``), manteniendo el orden en que las devuelve
+    la API.
+    """
+    try:
+        path = f"/orgs/{org_name}/repos"
+
+        def get_page(page: int) -> List[Dict[str, Any]]:
+            return api.get(path, {"per_page": MAX_PAGE_SIZE, "page": page})[0]
+
+        print(f"\nObteniendo repositorios de la organización {org_name}...")
+        first_page, headers = api.get(path, {"per_page": MAX_PAGE_SIZE, "page": 1})
+        pages = [first_page]
+        page_count = last_page_number(headers)
+        if page_count > 1:
+            with ThreadPoolExecutor(max_workers=jobs) as executor:
+                pages += tqdm(
+                    executor.map(get_page, range(2, page_count + 1)),
+                    total=page_count,
+                    initial=1,
+                    desc="Obteniendo páginas",
+                )
+
+        # Un repositorio creado o borrado durante el listado desplaza las
+        # páginas y puede aparecer dos veces
+        names = dict.fromkeys(repo["name"] for page in pages for repo in page)
+        return [f"git@github.com:{org_name}/{name}.git" for name in names]
+
+    except Exception as e:
+        print(f"❌ Error al obtener repositorios: {str(e)}")
+        sys.exit(1)
 
 
-def get_org_repos(github_client: Github, org_name: str) -> List[str]:
-    """Obtiene la lista de repositorios de una organización."""
+def get_org_repos_pushed_since(
+    api: GitHubApi, org_name: str, pushed_since: str
+) -> List[str]:
+    """Obtiene los repositorios de una organización con pushes desde
+    ``pushed_since`` (ISO 8601, UTC).
+
+    Las páginas se piden ordenadas por fecha de push descendente y una a una,
+    deteniéndose en el primer repositorio más antiguo.
+    """
     try:
-        org = github_client.get_organization(org_name)
+        path = f"/orgs/{org_name}/repos"
+        params = {"sort": "pushed", "direction": "desc", "per_page": MAX_PAGE_SIZE}
         repos = []
+        print(
+            f"\nObteniendo repositorios de la organización {org_name} "
+            f"con cambios desde {pushed_since}..."
+        )
+        page = 1
+        while True:
+            page_repos, headers = api.get(path, {**params, "page": page})
+            for repo in page_repos:
+                # Los repositorios vacíos no tienen fecha de push
+                if (repo.get("pushed_at") or "") < pushed_since:
+                    return repos
+                repos.append(f"git@github.com:{org_name}/{repo['name']}.git")
+            if page >= last_page_number(headers):
+                return repos
+            page += 1
+
+    except Exception as e:
+        print(f"❌ Error al obtener repositorios: {str(e)}")
+        sys.exit(1)
+
+
+def repo_metadata_from_node(node: Dict[str, Any]) -> Dict[str, Any]:
+    """Convierte un repositorio de la respuesta GraphQL en sus metadatos."""
+    parent = node["parent"]
+    metadata = {
+        "url": node["url"],
+        "ssh_url": node["sshUrl"],
+        # Los repositorios vacíos no tienen rama por defecto
+        "default_branch": (node["defaultBranchRef"] or {}).get("name"),
+        "size": node["diskUsage"],
+        "pushed_at": node["pushedAt"],
+        "fork": node["isFork"],
+        "archived": node["isArchived"],
+        "parent": parent["nameWithOwner"] if parent else None,
+    }
+    # La red de forks es el repositorio raíz; para un fork de un fork (o con el
+    # padre inaccesible) no se conoce y el downloader la consulta por REST
+    if not node["isFork"]:
+        metadata["network"] = node["nameWithOwner"].lower()
+    elif parent and not parent["isFork"]:
+        metadata["network"] = parent["nameWithOwner"].lower()
+    return metadata
+
+
+def get_org_repos_graphql(
+    api: GitHubApi, org_name: str, pushed_since: Optional[str] = None
+) -> Tuple[List[str], Dict[str, Dict[str, Any]]]:
+    """Obtiene los repositorios de una organización y sus metadatos con la API
+    GraphQL, 100 repositorios por consulta.
 
+    Con ``pushed_since`` (ISO 8601, UTC) se piden ordenados por fecha de push
+    descendente y el listado se detiene en el primer repositorio más antiguo.
+    Devuelve las URLs SSH y los metadatos indexados por ``owner/repo``.
+    """
+    repos, metadata = [], {}
+    variables = {"org": org_name, "cursor": None}
+    if pushed_since:
+        variables["orderBy"] = {"field": "PUSHED_AT", "direction": "DESC"}
+    else:
+        variables["orderBy"] = {"field": "NAME", "direction": "ASC"}
+    try:
         print(f"\nObteniendo repositorios de la organización {org_name}...")
-        for repo in tqdm(org.get_repos(), desc="Procesando repositorios"):
-            repos.append(f"git@github.com:{org_name}/{repo.name}.git")
+        with tqdm(desc="Procesando repositorios") as progress:
+            while True:
+                data = api.graphql(ORG_REPOS_QUERY, variables)
+                connection = data["organization"]["repositories"]
+                progress.total = connection["totalCount"]
+                for node in connection["nodes"]:
+                    if pushed_since and (node["pushedAt"] or "") < pushed_since:
+                        return repos, metadata
+                    repos.append(node["sshUrl"])
+                    metadata[node["nameWithOwner"]] = repo_metadata_from_node(node)
+                progress.update(len(connection["nodes"]))
 
-        return repos
+                if not connection["pageInfo"]["hasNextPage"]:
+                    return repos, metadata
+                variables = {**variables, "cursor": connection["pageInfo"]["endCursor"]}
 
     except Exception as e:
         print(f"❌ Error al obtener repositorios: {str(e)}")
         sys.exit(1)
 
 
+def save_metadata_to_file(
+    metadata: Dict[str, Dict[str, Any]], output_file: str
+) -> None:
+    """Guarda los metadatos de los repositorios en un archivo JSON."""
+    try:
+        with open(output_file, "w") as f:
+            json.dump(metadata, f, indent=2, sort_keys=True)
+        print(
+            f"\n✅ Metadatos de {len(metadata)} repositorios guardados en {output_file}"
+        )
+    except Exception as e:
+        print(f"❌ Error al guardar el archivo: {str(e)}")
+        sys.exit(1)
+
+
+def load_last_run(state_file: str, org_name: str) -> Optional[str]:
+    """Devuelve la fecha de la última ejecución correcta para la organización."""
+    try:
+        with open(state_file, "r") as f:
+            return json.load(f).get("orgs", {}).get(org_name.lower())
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"⚠️  Ignorando el archivo de estado {state_file}: {str(e)}")
+        return None
+
+
+def save_last_run(state_file: str, org_name: str, timestamp: str) -> None:
+    """Guarda la fecha de la última ejecución correcta para la organización."""
+    try:
+        with open(state_file, "r") as f:
+            state = json.load(f)
+    except Exception:
+        state = {}
+    state.setdefault("orgs", {})[org_name.lower()] = timestamp
+    try:
+        tmp_path = f"{state_file}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, state_file)
+    except Exception as e:
+        print(f"❌ Error al guardar el archivo de estado: {str(e)}")
+        sys.exit(1)
+
+
 def save_repos_to_file(repos: List[str], output_file: str) -> None:
     """Guarda la lista de repositorios en un archivo."""
     try:
@@ -52,6 +311,23 @@ def save_repos_to_file(repos: List[str], output_file: str) -> None:
         sys.exit(1)
 
 
+def print_api_usage(api: GitHubApi) -> None:
+    """Muestra las peticiones, esperas por límite y cuota restante de la API."""
+    stats = api.stats
+    print(
+        f"\nPeticiones a la API: {stats['requests']} "
+        f"({stats['rate_limit_waits']} esperas por límite agotado, "
+        f"{stats['secondary_backoffs']} por límite secundario, "
+        f"{stats['waited_seconds']}s de espera)"
+    )
+    for resource, quota in sorted(api.rate_limits.items()):
+        reset = datetime.fromtimestamp(quota["reset"]).strftime("%H:%M:%S")
+        print(
+            f"Cuota {resource}: {quota['remaining']}/{quota['limit']} restantes, "
+            f"se renueva a las {reset}"
+        )
+
+
 def get_config_values(args) -> tuple[str, str]:
     """Obtiene los valores de configuración desde argumentos o variables de entorno."""
     # Cargar variables de entorno desde .env si existe
@@ -79,9 +355,42 @@ def main() -> None:
     args = parse_args()
 
     token, org = get_config_values(args)
+    # Se guarda el inicio de la ejecución: los pushes posteriores entran en la
+    # siguiente
+    started_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    pushed_since = None
+    if args.changed_since_last_run:
+        pushed_since = load_last_run(args.state_file, org)
+        if not pushed_since:
+            print(
+                "\nSin ejecución anterior registrada: se listan todos los repositorios"
+            )
 
-    github_client = Github(token)
-    repos = get_org_repos(github_client, org)
+    cache = None
+    if args.cache_dir:
+        cache = ResponseCache(
+            args.cache_dir,
+            max_bytes=args.cache_max_mb * 1024 * 1024,
+            max_age=args.cache_max_age * 24 * 3600,
+        )
+    api = GitHubApi(token, cache=cache, pool_size=args.jobs, rate=args.api_rate)
+
+    if args.graphql:
+        repos, metadata = get_org_repos_graphql(api, org, pushed_since)
+        if args.metadata:
+            save_metadata_to_file(metadata, args.metadata)
+    elif pushed_since:
+        repos = get_org_repos_pushed_since(api, org, pushed_since)
+    else:
+        repos = get_org_repos(api, org, args.jobs)
+
+    if cache:
+        remaining, evicted = cache.evict()
+        print(
+            f"\nCaché: {api.stats['cache_hits']} páginas sin cambios (304), "
+            f"{api.stats['cache_misses']} descargadas; {remaining} entradas, "
+            f"{evicted} descartadas"
+        )
 
     if args.output:
         save_repos_to_file(repos, args.output)
@@ -90,6 +399,9 @@ def main() -> None:
         for repo in repos:
             print(repo)
 
+    print_api_usage(api)
+    save_last_run(args.state_file, org, started_at)
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+
+import glob
+import logging
+import os
+import shutil
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from git import Repo
+
+# Maintenance commands in the order they run. The geometric repack rolls loose
+# objects and small packs into fewer packs and rewrites the multi-pack-index,
+# so it is planned instead of a separate multi-pack-index write.
+MAINTENANCE_COMMANDS = {
+    "pack-refs": ["pack-refs", "--all"],
+    "repack": ["repack", "-d", "-l", "--geometric=2", "--write-midx"],
+    "multi-pack-index": ["multi-pack-index", "write"],
+    "commit-graph": ["commit-graph", "write", "--reachable", "--split"],
+}
+
+
+def low_priority_prefix() -> List[str]:
+    """Return a command prefix that runs a process at idle CPU and I/O
+    priority, using whichever of ``ionice``/``nice`` is available."""
+    prefix = []
+    if shutil.which("ionice"):
+        prefix += ["ionice", "-c", "3"]
+    if shutil.which("nice"):
+        prefix += ["nice", "-n", "19"]
+    return prefix
+
+
+@dataclass
+class MaintenanceThresholds:
+    """Per-repository limits above which maintenance tasks are scheduled."""
+
+    loose_objects: int = 500
+    packs: int = 8
+    loose_refs: int = 100
+
+
+def repository_stats(git_dir: str) -> Dict[str, int]:
+    """Collect the object and ref counts that drive maintenance decisions.
+
+    Only local files are inspected: loose objects and refs are counted and the
+    modification times of packs and of the commit-graph are compared.
+    """
+    objects_dir = os.path.join(git_dir, "objects")
+    loose_dirs = glob.glob(os.path.join(objects_dir, "[0-9a-f][0-9a-f]"))
+    loose_objects = sum(len(os.listdir(path)) for path in loose_dirs)
+    pack_mtimes = [
+        os.path.getmtime(path)
+        for path in glob.glob(os.path.join(objects_dir, "pack", "*.pack"))
+    ]
+    loose_refs = sum(
+        len(files) for _, _, files in os.walk(os.path.join(git_dir, "refs"))
+    )
+
+    graph_paths = [
+        os.path.join(objects_dir, "info", "commit-graph"),
+        os.path.join(objects_dir, "info", "commit-graphs", "commit-graph-chain"),
+    ]
+    graph_mtimes = [
+        os.path.getmtime(path) for path in graph_paths if os.path.exists(path)
+    ]
+    # Fetches add packs, or loose objects for small fetches
+    newest_objects = max(
+        pack_mtimes + [os.path.getmtime(path) for path in loose_dirs], default=0
+    )
+
+    return {
+        "loose_objects": loose_objects,
+        "packs": len(pack_mtimes),
+        "loose_refs": loose_refs,
+        "multi_pack_index": int(
+            os.path.exists(os.path.join(objects_dir, "pack", "multi-pack-index"))
+        ),
+        "commit_graph_stale": int(
+            not graph_mtimes or newest_objects > max(graph_mtimes)
+        ),
+    }
+
+
+def plan_maintenance(
+    stats: Dict[str, int], thresholds: MaintenanceThresholds
+) -> List[str]:
+    """Return the maintenance tasks a repository with ``stats`` needs."""
+    tasks = []
+    if stats["loose_refs"] > thresholds.loose_refs:
+        tasks.append("pack-refs")
+    repack = (
+        stats["loose_objects"] > thresholds.loose_objects
+        or stats["packs"] > thresholds.packs
+    )
+    if repack:
+        tasks.append("repack")
+    elif stats["packs"] > 1 and not stats["multi_pack_index"]:
+        tasks.append("multi-pack-index")
+    if repack or stats["commit_graph_stale"]:
+        tasks.append("commit-graph")
+    return tasks
+
+
+class MaintenanceScheduler:
+    """Run repository maintenance in a separate low-priority worker pool.
+
+    Repositories are scheduled as soon as they are synced, so maintenance
+    overlaps with the rest of the run. Tasks are chosen per repository from its
+    loose object, pack and loose ref counts, and run through ``nice``/``ionice``
+    so they yield to the sync workers. summary() waits for all scheduled work.
+    """
+
+    def __init__(
+        self,
+        jobs: int,
+        thresholds: Optional[MaintenanceThresholds] = None,
+    ) -> None:
+        self.thresholds = thresholds or MaintenanceThresholds()
+        self._executor = ThreadPoolExecutor(
+            max_workers=jobs, thread_name_prefix="maintenance"
+        )
+        self._prefix = low_priority_prefix()
+        self._lock = threading.Lock()
+        self._counts: Counter = Counter()
+
+    def schedule(self, repo_dir: str, logger: logging.Logger) -> None:
+        """Queue maintenance of the repository in ``repo_dir``."""
+        self._executor.submit(self._maintain, repo_dir, logger)
+
+    def _maintain(self, repo_dir: str, logger: logging.Logger) -> None:
+        try:
+            git_repo = Repo(repo_dir)
+            stats = repository_stats(git_repo.git_dir)
+            tasks = plan_maintenance(stats, self.thresholds)
+            if not tasks:
+                self._increment("healthy")
+                return
+
+            logger.info(
+                f"Maintenance: {', '.join(tasks)} ({stats['loose_objects']} loose "
+                f"objects, {stats['packs']} packs, {stats['loose_refs']} loose refs)"
+            )
+            for task in tasks:
+                git_repo.git.execute(
+                    [*self._prefix, "git", *MAINTENANCE_COMMANDS[task]]
+                )
+                self._increment(task)
+            self._increment("maintained")
+        except Exception as e:
+            logger.error(f"Maintenance failed: {str(e)}")
+            self._increment("failed")
+
+    def _increment(self, key: str) -> None:
+        with self._lock:
+            self._counts[key] += 1
+
+    def summary(self) -> Dict[str, int]:
+        """Wait for all scheduled maintenance and return the number of
+        maintained, healthy and failed repositories and of runs per task."""
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            return dict(self._counts)
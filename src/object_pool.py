@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+import os
+import threading
+from typing import Dict, Optional
+
+from git import Repo
+from git.exc import GitCommandError
+
+from ref_filter import RefFilter
+
+# Pool repositories are never garbage collected: member repositories borrow
+# their objects through alternates, so dropping an unreferenced object from the
+# pool could corrupt a member.
+POOL_CONFIG = {
+    "gc.auto": "0",
+    "gc.pruneExpire": "never",
+}
+
+
+class ObjectPool:
+    """Shared object databases for repositories of the same fork network.
+
+    Every network gets one bare pool repository under ``path``. Each member is
+    a remote of the pool whose branches and tags are fetched into a namespace of
+    their own, so objects common to the network are downloaded and stored once.
+    Member repositories borrow them through ``objects/info/alternates``.
+
+    Updates of the same pool are serialised, so concurrent workers processing
+    forks of one network do not fetch the same objects twice.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = os.path.abspath(path)
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def pool_dir(self, network: str) -> str:
+        """Return the pool repository directory of ``network``."""
+        return os.path.join(self.path, f"{network.lower().replace('/', '_')}.git")
+
+    def _lock(self, pool_dir: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(pool_dir, threading.Lock())
+
+    def _open(self, pool_dir: str) -> Repo:
+        if os.path.exists(pool_dir):
+            return Repo(pool_dir)
+        pool_repo = Repo.init(pool_dir, bare=True, mkdir=True)
+        with pool_repo.config_writer() as config:
+            for key, value in POOL_CONFIG.items():
+                section, option = key.split(".")
+                config.set_value(section, option, value)
+        return pool_repo
+
+    def update(
+        self,
+        network: str,
+        repo_url: str,
+        member: str,
+        ref_filter: Optional[RefFilter] = None,
+    ) -> str:
+        """Fetch the branches and tags of ``repo_url`` selected by
+        ``ref_filter`` into the pool of ``network``, registering it as remote
+        ``member`` if needed.
+
+        Returns the pool repository directory.
+        """
+        pool_dir = self.pool_dir(network)
+        remote_name = member.lower().replace("/", "_")
+        refspecs = (ref_filter or RefFilter()).refspecs(
+            f"refs/remotes/{remote_name}/heads/", f"refs/remotes/{remote_name}/tags/"
+        )
+        with self._lock(pool_dir):
+            pool_repo = self._open(pool_dir)
+            if remote_name not in [remote.name for remote in pool_repo.remotes]:
+                pool_repo.git.remote("add", "--no-tags", remote_name, repo_url)
+            try:
+                current = pool_repo.git.config(
+                    "--get-all", f"remote.{remote_name}.fetch"
+                ).splitlines()
+            except GitCommandError:
+                current = []
+            if current != refspecs:
+                if current:
+                    pool_repo.git.config("--unset-all", f"remote.{remote_name}.fetch")
+                for refspec in refspecs:
+                    pool_repo.git.config(
+                        "--add", f"remote.{remote_name}.fetch", refspec
+                    )
+            # No --prune: objects of deleted branches may still be borrowed
+            pool_repo.git.fetch(remote_name)
+        return pool_dir
+
+
+def link_object_pool(git_repo: Repo, pool_dir: str) -> bool:
+    """Add the pool's object directory to the alternates of ``git_repo``.
+
+    Returns True if the alternate was newly added.
+    """
+    pool_objects = os.path.join(os.path.abspath(pool_dir), "objects")
+    alternates_path = os.path.join(git_repo.git_dir, "objects", "info", "alternates")
+    try:
+        with open(alternates_path, "r") as f:
+            alternates = f.read().splitlines()
+    except FileNotFoundError:
+        alternates = []
+    if pool_objects in alternates:
+        return False
+
+    os.makedirs(os.path.dirname(alternates_path), exist_ok=True)
+    with open(alternates_path, "a") as f:
+        f.write(f"{pool_objects}\n")
+    return True
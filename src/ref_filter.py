@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+import dataclasses
+from dataclasses import dataclass, field
+from fnmatch import fnmatchcase
+from typing import Any, Dict, List, Optional
+
+REF_FILTER_KEYS = (
+    "include_branches",
+    "exclude_branches",
+    "include_tags",
+    "exclude_tags",
+)
+
+
+def validate_ref_pattern(pattern: str) -> str:
+    """Check that ``pattern`` can be used as a git refspec glob.
+
+    Refspecs only support a single ``*`` wildcard (which also matches ``/``),
+    so ``?``, character classes and multiple ``*`` are rejected.
+    """
+    if not isinstance(pattern, str) or not pattern:
+        raise ValueError(f"invalid ref pattern: {pattern!r}")
+    if pattern.count("*") > 1 or set("?[]\\") & set(pattern):
+        raise ValueError(f"ref pattern may only contain a single '*': {pattern!r}")
+    return pattern
+
+
+@dataclass
+class RefFilter:
+    """Glob include/exclude rules for the branches and tags to synchronise.
+
+    Rules are turned into fetch refspecs: includes become the source patterns,
+    which git sends to the server as ref prefixes so other refs are never
+    advertised, and excludes become negative refspecs so matching refs are
+    never fetched. An empty include list means every branch (or tag).
+    """
+
+    include_branches: List[str] = field(default_factory=list)
+    exclude_branches: List[str] = field(default_factory=list)
+    include_tags: List[str] = field(default_factory=list)
+    exclude_tags: List[str] = field(default_factory=list)
+
+    def __post_init__(self) -> None:
+        for key in REF_FILTER_KEYS:
+            patterns = getattr(self, key)
+            if not isinstance(patterns, list):
+                raise ValueError(f"{key} must be a list of patterns")
+            for pattern in patterns:
+                validate_ref_pattern(pattern)
+
+    @property
+    def active(self) -> bool:
+        return any(getattr(self, key) for key in REF_FILTER_KEYS)
+
+    def override(self, rules: Dict[str, Any]) -> "RefFilter":
+        """Return a copy where the rule lists present in ``rules`` (e.g. from a
+        per-repository config) replace these."""
+        overrides = {key: rules[key] for key in REF_FILTER_KEYS if key in rules}
+        return dataclasses.replace(self, **overrides)
+
+    def with_default_branch(self, branch: Optional[str]) -> "RefFilter":
+        """Return a copy that also keeps the default ``branch``, which is the
+        one checked out and the remote HEAD.
+
+        The branch is added to the include globs when they do not match it,
+        and exclude globs matching it are dropped: negative refspecs cannot
+        make exceptions.
+        """
+        if not branch or not self.active or self.matches(f"refs/heads/{branch}"):
+            return self
+        include = self.include_branches
+        if include and not any(fnmatchcase(branch, pattern) for pattern in include):
+            include = include + [branch]
+        exclude = [
+            pattern
+            for pattern in self.exclude_branches
+            if not fnmatchcase(branch, pattern)
+        ]
+        return dataclasses.replace(
+            self, include_branches=include, exclude_branches=exclude
+        )
+
+    def refspecs(self, branch_prefix: str, tag_prefix: str) -> List[str]:
+        """Fetch refspecs storing branches under ``branch_prefix`` and tags
+        under ``tag_prefix``."""
+        specs = [
+            f"+refs/heads/{pattern}:{branch_prefix}{pattern}"
+            for pattern in self.include_branches or ["*"]
+        ]
+        specs += [f"^refs/heads/{pattern}" for pattern in self.exclude_branches]
+        specs += [
+            f"+refs/tags/{pattern}:{tag_prefix}{pattern}"
+            for pattern in self.include_tags or ["*"]
+        ]
+        specs += [f"^refs/tags/{pattern}" for pattern in self.exclude_tags]
+        return specs
+
+    def matches(self, ref_name: str) -> bool:
+        """Return True if the remote ``refs/heads/`` or ``refs/tags/`` ref
+        passes the rules."""
+        if ref_name.startswith("refs/heads/"):
+            name = ref_name[len("refs/heads/") :]
+            include, exclude = self.include_branches, self.exclude_branches
+        elif ref_name.startswith("refs/tags/"):
+            name = ref_name[len("refs/tags/") :]
+            include, exclude = self.include_tags, self.exclude_tags
+        else:
+            return False
+        return any(fnmatchcase(name, pattern) for pattern in include or ["*"]) and not (
+            any(fnmatchcase(name, pattern) for pattern in exclude)
+        )
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+import os
+from typing import Dict, List, Optional
+
+PACKED_REFS = "packed-refs"
+SYMREF_PREFIX = "ref: "
+
+
+def find_git_dir(repo_dir: str) -> str:
+    """Return the git directory of a working tree or bare repository,
+    following ``.git`` files (``gitdir: <path>``) of linked worktrees."""
+    dot_git = os.path.join(repo_dir, ".git")
+    if os.path.isdir(dot_git):
+        return dot_git
+    if os.path.isfile(dot_git):
+        with open(dot_git, encoding="utf-8") as f:
+            git_dir = f.read().strip()[len("gitdir:") :].strip()
+        return os.path.normpath(os.path.join(repo_dir, git_dir))
+    return repo_dir
+
+
+def _common_dir(git_dir: str) -> str:
+    """Return the directory holding the shared refs of a linked worktree."""
+    try:
+        with open(os.path.join(git_dir, "commondir"), encoding="utf-8") as f:
+            return os.path.normpath(os.path.join(git_dir, f.read().strip()))
+    except FileNotFoundError:
+        return git_dir
+
+
+def _read_ref_file(path: str) -> Optional[str]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read().strip()
+    except (FileNotFoundError, IsADirectoryError):
+        # Deleted or replaced by a directory while the refs were walked
+        return None
+
+
+class RefSnapshot:
+    """The refs of a repository, read once from ``packed-refs`` and the loose
+    ref files without running git.
+
+    ``refs`` maps ref names to object ids; loose refs take precedence over
+    packed ones, as in git. Symbolic refs (HEAD, ``refs/remotes/origin/HEAD``)
+    are kept apart in ``symrefs`` mapping them to their target ref name.
+    """
+
+    def __init__(self, refs: Dict[str, str], symrefs: Dict[str, str]) -> None:
+        self.refs = refs
+        self.symrefs = symrefs
+
+    @classmethod
+    def read(cls, git_dir: str) -> "RefSnapshot":
+        """Read the refs of the repository whose git directory is ``git_dir``."""
+        common_dir = _common_dir(git_dir)
+        if os.path.isdir(os.path.join(common_dir, "reftable")):
+            raise ValueError("reftable ref storage is not supported")
+
+        refs, symrefs = {}, {}
+        try:
+            with open(os.path.join(common_dir, PACKED_REFS), encoding="utf-8") as f:
+                for line in f:
+                    # Skip the header and the peeled ids of annotated tags
+                    if line.startswith(("#", "^")):
+                        continue
+                    sha, ref_name = line.rstrip("\n").split(" ", 1)
+                    refs[ref_name] = sha
+        except FileNotFoundError:
+            pass
+
+        for root, _, files in os.walk(os.path.join(common_dir, "refs")):
+            for name in files:
+                if name.endswith(".lock"):
+                    continue
+                path = os.path.join(root, name)
+                value = _read_ref_file(path)
+                if not value:
+                    continue
+                ref_name = os.path.relpath(path, common_dir).replace(os.sep, "/")
+                if value.startswith(SYMREF_PREFIX):
+                    symrefs[ref_name] = value[len(SYMREF_PREFIX) :]
+                    refs.pop(ref_name, None)
+                else:
+                    refs[ref_name] = value
+
+        head = _read_ref_file(os.path.join(git_dir, "HEAD"))
+        if head and head.startswith(SYMREF_PREFIX):
+            symrefs["HEAD"] = head[len(SYMREF_PREFIX) :]
+        return cls(refs, symrefs)
+
+    def with_prefix(self, prefix: str) -> Dict[str, str]:
+        """Return the refs below ``prefix`` keyed by the rest of their name."""
+        return {
+            ref_name[len(prefix) :]: sha
+            for ref_name, sha in self.refs.items()
+            if ref_name.startswith(prefix)
+        }
+
+    def branches(self) -> List[str]:
+        """Return the sorted names of the local branches."""
+        return sorted(self.with_prefix("refs/heads/"))
+
+    def symref(self, name: str) -> Optional[str]:
+        """Return the target of the symbolic ref ``name``, if it is one."""
+        return self.symrefs.get(name)
+
+    def head_branch(self) -> Optional[str]:
+        """Return the checked-out branch, or None if HEAD is detached."""
+        target = self.symref("HEAD")
+        if target and target.startswith("refs/heads/"):
+            return target[len("refs/heads/") :]
+        return None
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from typing import Callable, Dict, Iterable, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS repos (
+    repo_url TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+)
+"""
+
+
+class WorkQueue:
+    """SQLite-backed repository queue shared by several downloader processes.
+
+    A worker claims a repository with a time-limited lease and must renew it
+    with heartbeat() while it works. Leases that expire (e.g. the worker was
+    killed) make the repository claimable again, so workers can be added or
+    removed mid-run without losing or duplicating repositories.
+
+    Every operation uses its own short-lived connection, so one instance can be
+    shared between threads. The default rollback journal is kept (rather than
+    WAL) so the database also works on shared filesystems.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        lease_seconds: float = 300,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self._clock = clock
+        with closing(self._connect()) as connection:
+            connection.execute(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=60, isolation_level=None)
+
+    def add(self, repos: Iterable[str]) -> int:
+        """Enqueue repositories that are not in the queue yet.
+
+        Returns the number of newly added repositories.
+        """
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            next_position = connection.execute(
+                "SELECT COALESCE(MAX(position), -1) + 1 FROM repos"
+            ).fetchone()[0]
+            added = 0
+            for repo_url in repos:
+                cursor = connection.execute(
+                    "INSERT OR IGNORE INTO repos (repo_url, position) VALUES (?, ?)",
+                    (repo_url, next_position + added),
+                )
+                added += cursor.rowcount
+            connection.execute("COMMIT")
+            return added
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+
+    def claim(self, worker: str) -> Optional[str]:
+        """Lease the next pending (or expired) repository to ``worker``.
+
+        Returns None when there is nothing left to claim.
+        """
+        now = self._clock()
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute(
+                "SELECT repo_url FROM repos "
+                "WHERE status = 'pending' "
+                "OR (status = 'leased' AND lease_expires < ?) "
+                "ORDER BY position LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is not None:
+                connection.execute(
+                    "UPDATE repos SET status = 'leased', worker = ?, "
+                    "lease_expires = ?, attempts = attempts + 1 WHERE repo_url = ?",
+                    (worker, now + self.lease_seconds, row[0]),
+                )
+            connection.execute("COMMIT")
+            return row[0] if row else None
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+
+    def heartbeat(self, repo_url: str, worker: str) -> bool:
+        """Extend the lease held by ``worker``.
+
+        Returns False if the lease was lost (expired and claimed by another
+        worker).
+        """
+        with closing(self._connect()) as connection:
+            cursor = connection.execute(
+                "UPDATE repos SET lease_expires = ? "
+                "WHERE repo_url = ? AND worker = ? AND status = 'leased'",
+                (self._clock() + self.lease_seconds, repo_url, worker),
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, repo_url: str, worker: str, error: Optional[str] = None) -> None:
+        """Mark a leased repository as done, or failed with ``error``."""
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "UPDATE repos SET status = ?, error = ?, lease_expires = NULL "
+                "WHERE repo_url = ? AND worker = ? AND status = 'leased'",
+                ("failed" if error else "done", error, repo_url, worker),
+            )
+
+    def counts(self) -> Dict[str, int]:
+        """Return the number of repositories per status."""
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                "SELECT status, COUNT(*) FROM repos GROUP BY status"
+            ).fetchall()
+        return dict(rows)
+
+
+class LeaseHeartbeat:
+    """Context manager that renews a lease from a background thread.
+
+    If a renewal finds the lease lost (it expired and another worker claimed
+    the repository), the heartbeat stops, logs a warning and sets ``lost`` so
+    the caller can leave the repository to its new owner.
+    """
+
+    def __init__(
+        self,
+        work_queue: WorkQueue,
+        repo_url: str,
+        worker: str,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        self.work_queue = work_queue
+        self.repo_url = repo_url
+        self.worker = worker
+        self.logger = logger or logging.getLogger(__name__)
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        interval = self.work_queue.lease_seconds / 3
+        while not self._stop.wait(interval):
+            try:
+                renewed = self.work_queue.heartbeat(self.repo_url, self.worker)
+            except sqlite3.Error:
+                # A missed heartbeat is retried on the next interval
+                continue
+            if not renewed:
+                self.lost = True
+                self.logger.warning(
+                    f"Lease on {self.repo_url} was lost, another worker claimed it"
+                )
+                return
+
+    def __enter__(self) -> "LeaseHeartbeat":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        self._thread.join()
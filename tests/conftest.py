@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+
+import pytest
+from git import Repo
+
+
+@pytest.fixture(autouse=True)
+def git_identity(monkeypatch):
+    """Give every git command run by the tests an author and committer."""
+    for role in ("AUTHOR", "COMMITTER"):
+        monkeypatch.setenv(f"GIT_{role}_NAME", "Test")
+        monkeypatch.setenv(f"GIT_{role}_EMAIL", "test@example.com")
+
+
+@pytest.fixture
+def commit():
+    """Return a function recording an empty commit in a repository."""
+
+    def make_commit(repo, message):
+        repo.git.commit("--allow-empty", "-m", message)
+
+    return make_commit
+
+
+@pytest.fixture
+def make_repo(commit):
+    """Return a function creating a repository at ``path`` on ``branch``, with
+    an empty initial commit unless ``message`` is None."""
+
+    def make(path, branch="main", message="init"):
+        repo = Repo.init(path, initial_branch=branch)
+        if message is not None:
+            commit(repo, message)
+        return repo
+
+    return make
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+
+import pytest
+from git.exc import GitCommandError
+
+# Add src directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from adaptive_concurrency import AdaptiveConcurrencyLimiter, is_congestion_error
+
+
+class FakeClock:
+    """Manually advanced monotonic clock."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def run_window(limiter, clock, seconds, error=None):
+    """Complete one full window of jobs taking ``seconds`` in total."""
+    clock.now += seconds
+    for _ in range(limiter.limit):
+        limiter.acquire()
+    for _ in range(limiter.limit):
+        limiter.release(error)
+
+
+class TestIsCongestionError:
+    """Test cases for is_congestion_error function."""
+
+    def test_ssh_throttling(self):
+        """Test SSH connection throttling is detected."""
+        error = Exception("kex_exchange_identification: Connection closed")
+        assert is_congestion_error(error)
+
+    @pytest.mark.parametrize(
+        "stderr",
+        [
+            "kex_exchange_identification: Connection closed by remote host",
+            "ssh: connect to host github.com port 22: Connection timed out",
+            "ERROR: too many connections",
+            "fatal: the remote end hung up unexpectedly: Operation timed out",
+        ],
+    )
+    def test_git_command_throttling(self, stderr):
+        """Test throttling reported in the stderr of a failed git command is
+        detected through GitPython's stderr wrapper."""
+        error = GitCommandError(
+            ["git", "fetch", "git@github.com:org/repo.git"], 128, stderr
+        )
+        assert is_congestion_error(error)
+
+    def test_http_status_without_quotes(self):
+        """Test an HTTP status is detected when git quotes nothing."""
+        error = GitCommandError(
+            ["git", "fetch", "origin"],
+            128,
+            "error: RPC failed; HTTP 429 curl 22 The requested URL returned "
+            "error: 429",
+        )
+        assert is_congestion_error(error)
+
+    def test_regular_error(self):
+        """Test ordinary failures are not treated as congestion."""
+        assert not is_congestion_error(Exception("Repository not found"))
+
+    def test_http_status_in_stderr(self):
+        """Test throttling HTTP statuses reported by git are detected."""
+        error = GitCommandError(
+            ["git", "fetch", "origin"],
+            128,
+            "fatal: unable to access 'https://github.com/org/repo.git/': "
+            "The requested URL returned error: 503",
+        )
+        assert is_congestion_error(error)
+
+    def test_status_codes_in_repository_names_are_ignored(self):
+        """Test numbers in the command line or remote URL do not count."""
+        error = GitCommandError(
+            ["git", "clone", "https://github.com/org/svc-503.git", "org_svc-503"],
+            128,
+            "remote: Repository not found.\n"
+            "fatal: repository 'https://github.com/org/svc-503.git/' not found",
+        )
+        assert not is_congestion_error(error)
+        assert not is_congestion_error(
+            Exception("fatal: destination path 'org_svc-429' already exists")
+        )
+
+
+class TestAdaptiveConcurrencyLimiter:
+    """Test cases for AdaptiveConcurrencyLimiter class."""
+
+    def test_additive_increase_after_clean_window(self):
+        """Test the limit grows by one after a successful window."""
+        clock = FakeClock()
+        limiter = AdaptiveConcurrencyLimiter(initial=2, maximum=8, clock=clock)
+
+        run_window(limiter, clock, 1.0)
+        assert limiter.limit == 3
+
+    def test_limit_capped_at_maximum(self):
+        """Test the limit never exceeds the maximum."""
+        clock = FakeClock()
+        limiter = AdaptiveConcurrencyLimiter(initial=4, maximum=4, clock=clock)
+
+        run_window(limiter, clock, 1.0)
+        assert limiter.limit == 4
+
+    def test_multiplicative_decrease_on_congestion(self):
+        """Test a congestion failure halves the limit."""
+        clock = FakeClock()
+        limiter = AdaptiveConcurrencyLimiter(initial=8, maximum=16, clock=clock)
+
+        limiter.acquire()
+        limiter.release(Exception("ERROR: too many connections"))
+        assert limiter.limit == 4
+
+    def test_one_decrease_per_window(self):
+        """Test simultaneous congestion failures only halve the limit once."""
+        clock = FakeClock()
+        limiter = AdaptiveConcurrencyLimiter(initial=16, maximum=16, clock=clock)
+
+        for _ in range(16):
+            limiter.acquire()
+        for _ in range(4):
+            limiter.release(Exception("Connection timed out"))
+        assert limiter.limit == 8
+
+        # The window ends after 8 jobs; the next congestion failure decreases
+        for _ in range(4):
+            limiter.release()
+        limiter.release(Exception("Connection timed out"))
+        assert limiter.limit == 4
+
+    def test_decrease_floored_at_minimum(self):
+        """Test the limit never drops below the minimum."""
+        clock = FakeClock()
+        limiter = AdaptiveConcurrencyLimiter(initial=1, maximum=4, clock=clock)
+
+        limiter.acquire()
+        limiter.release(Exception("Connection timed out"))
+        assert limiter.limit == 1
+
+    def test_decrease_on_high_error_rate(self):
+        """Test a window full of errors halves the limit."""
+        clock = FakeClock()
+        limiter = AdaptiveConcurrencyLimiter(initial=4, maximum=8, clock=clock)
+
+        run_window(limiter, clock, 1.0, error=Exception("Repository not found"))
+        assert limiter.limit == 2
+
+    def test_throughput_drop_undoes_increase(self):
+        """Test a throughput drop steps the limit back down."""
+        clock = FakeClock()
+        limiter = AdaptiveConcurrencyLimiter(initial=2, maximum=8, clock=clock)
+
+        run_window(limiter, clock, 1.0)  # 2 repos/s, limit -> 3
+        run_window(limiter, clock, 3.0)  # 1 repo/s, limit -> 2
+        assert limiter.limit == 2
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import sys
+
+import pytest
+
+# Add src directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from common import positive_float, positive_int
+
+
+class TestArgumentTypes:
+    """Test cases for the argparse types shared by the scripts."""
+
+    def test_positive_int(self):
+        """Test integers from 1 up are accepted."""
+        assert positive_int("3") == 3
+        for value in ("0", "-1", "x"):
+            with pytest.raises(argparse.ArgumentTypeError):
+                positive_int(value)
+
+    def test_positive_float(self):
+        """Test numbers above zero are accepted."""
+        assert positive_float("0.5") == 0.5
+        for value in ("0", "-2", "x"):
+            with pytest.raises(argparse.ArgumentTypeError):
+                positive_float(value)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -1,23 +1,60 @@
 #!/usr/bin/env python3
 
+import copy
 import os
+import sqlite3
 import sys
 import tempfile
-import unittest.mock as mock
+import threading
+import time
 from unittest.mock import MagicMock, patch
 
 import pytest
+from git import Repo
+from git.exc import GitCommandError
 
 # Add src directory to path for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
 
 from downloader import (
+    apply_repo_metadata,
     get_repo_name_from_url,
     read_repos_file,
     get_default_branch,
     clean_untracked_files,
     parse_args,
+    get_repo_slug,
+    RepoLoggerAdapter,
+    estimate_repo_costs,
+    order_longest_first,
+    record_durations,
+    create_local_branches,
+    fetch_repository,
+    materialize_repository,
+    get_repo_shard,
+    filter_shard,
+    update_local_branch_refs,
+    SyncOptions,
+    refs_unchanged,
+    parse_ls_remote,
+    update_remote_head,
+    load_default_branches,
+    record_default_branches,
+    resolve_fork_networks,
+    configure_ref_filter,
+    prune_filtered_refs,
+    load_repo_config,
+    configure_sparse_checkout,
+    run_repositories,
+    run_pipeline,
+    run_queue_workers,
+    load_run_state,
+    save_run_state,
+    process_repository,
 )
+from ref_filter import RefFilter
+from work_queue import WorkQueue
+from ref_reader import RefSnapshot
 
 
 class TestGetRepoNameFromUrl:
@@ -54,6 +91,31 @@ class TestGetRepoNameFromUrl:
         assert result == "/microsoft/vscode"
 
 
+class TestGetRepoSlug:
+    """Test cases for get_repo_slug function."""
+
+    def test_ssh_url(self):
+        """Test SSH URL is reduced to owner/repo."""
+        assert get_repo_slug("git@github.com:user/repo.git") == "user/repo"
+
+    def test_https_url(self):
+        """Test HTTPS URL is reduced to owner/repo."""
+        assert get_repo_slug("https://github.com/user/repo.git") == "user/repo"
+
+
+class TestRepoLoggerAdapter:
+    """Test cases for RepoLoggerAdapter class."""
+
+    def test_prefixes_messages_with_repo(self):
+        """Test log messages are prefixed with the repository name."""
+        logger = MagicMock()
+        logger.isEnabledFor.return_value = True
+        adapter = RepoLoggerAdapter(logger, {"repo": "user/repo"})
+
+        adapter.info("Cloning repository...")
+        logger.log.assert_called_once_with(20, "[user/repo] Cloning repository...")
+
+
 class TestReadReposFile:
     """Test cases for read_repos_file function."""
 
@@ -103,43 +165,762 @@ class TestReadReposFile:
 class TestGetDefaultBranch:
     """Test cases for get_default_branch function."""
 
-    @patch("src.downloader.Repo")
-    def test_get_default_branch_success(self, mock_repo_class):
-        """Test successful default branch retrieval."""
+    def test_get_default_branch_success(self):
+        """Test the default branch is read from the remote HEAD symref."""
         mock_repo = MagicMock()
-        mock_remote = MagicMock()
-        mock_ref = MagicMock()
-        mock_ref.name = "origin/main"
-        mock_remote.refs = [mock_ref]
-        mock_repo.remote.return_value = mock_remote
+        refs = RefSnapshot(
+            {},
+            {
+                "HEAD": "refs/heads/main",
+                "refs/remotes/origin/HEAD": "refs/remotes/origin/trunk",
+            },
+        )
 
-        result = get_default_branch(mock_repo)
-        assert result == "main"
-        mock_remote.fetch.assert_called_once()
+        result = get_default_branch(mock_repo, refs)
+        assert result == "trunk"
+        mock_repo.git.symbolic_ref.assert_not_called()
+        mock_repo.remote.assert_not_called()
 
-    @patch("src.downloader.Repo")
-    def test_get_default_branch_fallback_to_active(self, mock_repo_class):
-        """Test fallback to active branch when remote fetch fails."""
-        mock_repo = MagicMock()
-        mock_repo.remote.side_effect = Exception("Remote error")
-        mock_repo.active_branch.name = "master"
+    def test_get_default_branch_fallback_to_active(self):
+        """Test fallback to active branch when the remote HEAD is missing."""
+        refs = RefSnapshot({}, {"HEAD": "refs/heads/master"})
 
-        result = get_default_branch(mock_repo)
+        result = get_default_branch(MagicMock(), refs)
         assert result == "master"
 
-    @patch("src.downloader.Repo")
-    def test_get_default_branch_all_fail(self, mock_repo_class):
-        """Test when both remote and active branch fail."""
+    def test_get_default_branch_all_fail(self):
+        """Test when both remote HEAD and active branch are missing."""
+        result = get_default_branch(MagicMock(), RefSnapshot({"HEAD": "aaa"}, {}))
+        assert result is None
+
+
+class TestCreateLocalBranches:
+    """Test cases for create_local_branches function."""
+
+    REFS = RefSnapshot(
+        {
+            "refs/heads/main": "aaa",
+            "refs/remotes/origin/develop": "bbb",
+            "refs/remotes/origin/main": "aaa",
+        },
+        {
+            "HEAD": "refs/heads/main",
+            "refs/remotes/origin/HEAD": "refs/remotes/origin/main",
+        },
+    )
+
+    def test_is_local_only(self):
+        """Test branches are updated from fetched refs without network access."""
         mock_repo = MagicMock()
-        mock_repo.remote.side_effect = Exception("Remote error")
 
-        # Mock the active_branch property to raise an exception
-        type(mock_repo).active_branch = mock.PropertyMock(
-            side_effect=Exception("Active branch error")
+        result = create_local_branches(mock_repo, MagicMock(), refs=self.REFS)
+        assert result == ["develop (new)", "main (updated)"]
+        mock_repo.remote.assert_not_called()
+        mock_repo.git.pull.assert_not_called()
+        mock_repo.git.checkout.assert_any_call("-b", "develop", "origin/develop")
+        mock_repo.git.merge.assert_called_once_with("origin/main")
+
+
+class TestUpdateLocalBranchRefs:
+    """Test cases for update_local_branch_refs function."""
+
+    def test_creates_and_fast_forwards_without_checkout(self, make_repo, commit):
+        """Test branches are created/updated as refs and HEAD is left alone."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            origin = make_repo(os.path.join(temp_dir, "origin"))
+            origin.git.branch("develop")
+            clone = Repo.clone_from(origin.working_dir, os.path.join(temp_dir, "c"))
+            clone.git.branch("develop", "origin/develop")
+
+            origin.git.checkout("develop")
+            commit(origin, "work")
+            origin.git.branch("feature")
+            clone.remote().fetch()
+
+            result = update_local_branch_refs(clone, MagicMock())
+            assert result == ["develop (updated)", "feature (new)", "main (unchanged)"]
+            assert clone.heads.develop.commit == origin.heads.develop.commit
+            assert clone.heads.feature.commit == origin.heads.feature.commit
+            assert clone.active_branch.name == "main"
+            assert clone.heads.feature.tracking_branch().name == "origin/feature"
+
+    def test_conflicting_branch_fails_alone(self, make_repo, commit):
+        """Test a branch the batch cannot create fails without blocking the
+        other updates, and the checked-out branch moves with HEAD detached."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            origin = make_repo(os.path.join(temp_dir, "origin"))
+            clone = Repo.clone_from(origin.working_dir, os.path.join(temp_dir, "c"))
+            old_main = clone.heads.main.commit
+            clone.git.branch("feature")
+
+            commit(origin, "work")
+            origin.git.branch("feature/a")
+            origin.git.branch("other")
+            clone.remote().fetch()
+
+            result = update_local_branch_refs(clone, MagicMock())
+            assert result == [
+                "feature/a (failed)",
+                "main (updated)",
+                "other (new)",
+            ]
+            assert clone.heads.main.commit == origin.heads.main.commit
+            assert clone.heads.other.commit == origin.heads.main.commit
+            assert clone.head.is_detached
+            assert clone.head.commit == old_main
+            assert not clone.is_dirty()
+
+
+class TestRefsUnchanged:
+    """Test cases for refs_unchanged function."""
+
+    LS_REMOTE = "\n".join(
+        [
+            "aaa\trefs/heads/main",
+            "bbb\trefs/heads/develop",
+            "ccc\trefs/tags/v1",
+            "aaa\trefs/tags/v1^{}",
+        ]
+    )
+    LOCAL = {
+        "refs/heads/main": "aaa",
+        "refs/heads/develop": "bbb",
+        "refs/remotes/origin/main": "aaa",
+        "refs/remotes/origin/develop": "bbb",
+        "refs/remotes/upstream/main": "fff",
+        "refs/tags/v1": "ccc",
+    }
+
+    def test_identical_refs(self):
+        """Test matching heads and tags are reported as unchanged."""
+        assert refs_unchanged(self.LS_REMOTE, self.LOCAL, mirror=False)
+
+    def test_moved_branch(self):
+        """Test a moved remote branch is detected."""
+        ls_remote = self.LS_REMOTE.replace("bbb\trefs", "ddd\trefs")
+        assert not refs_unchanged(ls_remote, self.LOCAL, mirror=False)
+
+    def test_new_tag(self):
+        """Test a new remote tag is detected."""
+        ls_remote = self.LS_REMOTE + "\neee\trefs/tags/v2"
+        assert not refs_unchanged(ls_remote, self.LOCAL, mirror=False)
+
+    def test_stale_local_branch(self):
+        """Test a local branch behind its tracking branch is not skipped."""
+        local = {**self.LOCAL, "refs/heads/develop": "000"}
+        assert not refs_unchanged(self.LS_REMOTE, local, mirror=False)
+
+    def test_mirror_compares_local_heads(self):
+        """Test mirrors compare remote heads with their own branches."""
+        local = {
+            "refs/heads/main": "aaa",
+            "refs/heads/develop": "bbb",
+            "refs/tags/v1": "ccc",
+        }
+        assert refs_unchanged(self.LS_REMOTE, local, mirror=True)
+
+    def test_excluded_remote_refs_are_ignored(self):
+        """Test remote refs excluded by the branch/tag rules are not compared."""
+        ls_remote = self.LS_REMOTE + "\nfff\trefs/heads/dependabot/npm"
+        ref_filter = RefFilter(exclude_branches=["dependabot/*"])
+        assert not refs_unchanged(ls_remote, self.LOCAL, mirror=False)
+        assert refs_unchanged(
+            ls_remote, self.LOCAL, mirror=False, ref_filter=ref_filter
         )
 
-        result = get_default_branch(mock_repo)
-        assert result is None
+    def test_head_symref_is_parsed(self):
+        """Test the advertised HEAD symref names the default branch."""
+        ls_remote = "ref: refs/heads/develop\tHEAD\nbbb\tHEAD\n" + self.LS_REMOTE
+        remote_refs, default_branch = parse_ls_remote(ls_remote)
+        assert default_branch == "develop"
+        assert "HEAD" not in remote_refs
+        assert refs_unchanged(ls_remote, self.LOCAL, mirror=False)
+
+
+class TestUpdateRemoteHead:
+    """Test cases for caching the default branch in the remote HEAD symref."""
+
+    def test_default_branch_follows_remote_head(self, make_repo):
+        """Test a non-alphabetical default branch is resolved and updated."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            origin = make_repo(os.path.join(temp_dir, "origin"), branch="trunk")
+            origin.git.branch("alpha")
+            clone = Repo.clone_from(origin.working_dir, os.path.join(temp_dir, "c"))
+            assert get_default_branch(clone) == "trunk"
+
+            assert update_remote_head(clone, "alpha", mirror=False)
+            assert not update_remote_head(clone, "alpha", mirror=False)
+            assert get_default_branch(clone) == "alpha"
+
+
+class TestRefFilterConfig:
+    """Test cases for applying branch/tag rules to a repository."""
+
+    def test_configure_and_prune(self, make_repo):
+        """Test rules replace the refspecs and drop excluded tracking refs."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            origin = make_repo(os.path.join(temp_dir, "origin"))
+            origin.git.branch("dependabot/npm")
+            origin.git.tag("v1")
+            clone = Repo.clone_from(origin.working_dir, os.path.join(temp_dir, "c"))
+            ref_filter = RefFilter(exclude_branches=["dependabot/*"])
+
+            assert configure_ref_filter(clone, ref_filter, mirror=False)
+            assert not configure_ref_filter(clone, ref_filter, mirror=False)
+            assert clone.git.config("--get-all", "remote.origin.fetch").split() == [
+                "+refs/heads/*:refs/remotes/origin/*",
+                "^refs/heads/dependabot/*",
+                "+refs/tags/*:refs/tags/*",
+            ]
+
+            assert prune_filtered_refs(clone, ref_filter, mirror=False) == 1
+            assert [ref.name for ref in clone.remote().refs] == [
+                "origin/HEAD",
+                "origin/main",
+            ]
+            assert [tag.name for tag in clone.tags] == ["v1"]
+
+            assert configure_ref_filter(clone, RefFilter(), mirror=False)
+            assert clone.git.config("--get-all", "remote.origin.fetch") == (
+                "+refs/heads/*:refs/remotes/origin/*"
+            )
+
+    def test_load_repo_config(self):
+        """Test per-repository settings are keyed by lower-case slug."""
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+            f.write('{"Org/Repo": {"exclude_branches": ["renovate/*"]}}')
+        try:
+            configs = load_repo_config(f.name, MagicMock())
+            assert configs == {"org/repo": {"exclude_branches": ["renovate/*"]}}
+            options = SyncOptions(repo_configs=configs)
+            assert options.ref_filter_for("org/Repo").exclude_branches == ["renovate/*"]
+        finally:
+            os.unlink(f.name)
+
+    def test_load_repo_config_rejects_bad_sparse_checkout(self):
+        """Test sparse checkout settings must list directories."""
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+            f.write('{"org/repo": {"sparse_checkout": "services"}}')
+        try:
+            with pytest.raises(SystemExit):
+                load_repo_config(f.name, MagicMock())
+        finally:
+            os.unlink(f.name)
+
+    def test_load_repo_config_rejects_unknown_settings(self):
+        """Test typos in the per-repository config stop the run."""
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+            f.write('{"org/repo": {"exclude_branch": ["renovate/*"]}}')
+        try:
+            with pytest.raises(SystemExit):
+                load_repo_config(f.name, MagicMock())
+        finally:
+            os.unlink(f.name)
+
+
+class TestSparseCheckout:
+    """Test cases for per-repository sparse checkout."""
+
+    def test_sparse_clone_is_blobless(self):
+        """Test sparse clones only download blobs of the sparse directories."""
+        assert SyncOptions().clone_args(sparse=True) == [
+            "--filter=blob:none",
+            "--sparse",
+        ]
+        assert SyncOptions(clone_filter="tree:0").clone_args(sparse=True) == [
+            "--filter=tree:0",
+            "--sparse",
+        ]
+
+    def test_sparse_directories_come_from_repo_config(self):
+        """Test only configured repositories are sparse, and never mirrors."""
+        configs = {"org/mono": {"sparse_checkout": ["services/api"]}}
+        assert SyncOptions(repo_configs=configs).sparse_checkout_for("Org/Mono") == [
+            "services/api"
+        ]
+        assert SyncOptions(repo_configs=configs).sparse_checkout_for("org/a") == []
+        options = SyncOptions(mirror=True, repo_configs=configs)
+        assert options.sparse_checkout_for("org/mono") == []
+
+    def test_configure_sparse_checkout(self, make_repo):
+        """Test the working tree follows the configured directories."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo = make_repo(temp_dir, message=None)
+            for directory in ("api", "web"):
+                os.makedirs(os.path.join(temp_dir, directory))
+                with open(os.path.join(temp_dir, directory, "file"), "w") as f:
+                    f.write(directory)
+            repo.git.add(".")
+            repo.git.commit("-m", "init")
+            logger = MagicMock()
+
+            configure_sparse_checkout(repo, ["api/"], logger)
+            assert not os.path.exists(os.path.join(temp_dir, "web"))
+            assert os.path.exists(os.path.join(temp_dir, "api", "file"))
+
+            logger.reset_mock()
+            configure_sparse_checkout(repo, ["api"], logger)
+            logger.info.assert_not_called()
+
+            configure_sparse_checkout(repo, [], logger)
+            assert os.path.exists(os.path.join(temp_dir, "web", "file"))
+
+
+class TestSyncOptions:
+    """Test cases for SyncOptions class."""
+
+    def test_default_clone_args(self):
+        """Test a plain clone needs no extra options."""
+        assert SyncOptions().clone_args() == []
+
+    def test_filtered_clone_starts_with_default_branch(self):
+        """Test a filtered clone leaves other refs to the filtered fetch."""
+        options = SyncOptions(mirror=True, depth=5)
+        assert options.clone_args(filtered=True) == [
+            "--bare",
+            "--single-branch",
+            "--no-tags",
+            "--depth=5",
+        ]
+
+    def test_shallow_clone_keeps_all_branches(self):
+        """Test shallow clones limit history but not the set of branches."""
+        options = SyncOptions(depth=10)
+        assert options.clone_args() == ["--depth=10", "--no-single-branch"]
+        assert options.history_kwargs() == {"depth": 10}
+
+    def test_shallow_since_mirror_update(self):
+        """Test shallow mirrors are updated with a history-limited fetch."""
+        options = SyncOptions(mirror=True, shallow_since="2024-01-01")
+        assert options.mirror_update_args() == [
+            "fetch",
+            "--prune",
+            "--shallow-since=2024-01-01",
+            "origin",
+        ]
+
+    def test_partial_mirror_clone_args(self):
+        """Test mirror and partial clone filter options are combined."""
+        options = SyncOptions(mirror=True, clone_filter="blob:none")
+        assert options.clone_args() == ["--mirror", "--filter=blob:none"]
+
+
+class TestFetchRepository:
+    """Test cases for fetch_repository function."""
+
+    @patch("downloader.Repo")
+    def test_existing_repo_single_fetch(self, mock_repo_class):
+        """Test an existing repository is updated with exactly one fetch."""
+        with tempfile.TemporaryDirectory() as output_dir:
+            os.makedirs(os.path.join(output_dir, "_user_repo"))
+            mock_repo = mock_repo_class.return_value
+            mock_repo.bare = False
+
+            fetch_repository(
+                "https://github.com/user/repo.git", output_dir, MagicMock()
+            )
+            mock_repo.git.fetch.assert_called_once_with("--prune", "--tags", "origin")
+
+    @patch("downloader.Repo")
+    def test_existing_mirror_single_remote_update(self, mock_repo_class):
+        """Test a mirror is updated with one remote update and no fetch."""
+        with tempfile.TemporaryDirectory() as output_dir:
+            os.makedirs(os.path.join(output_dir, "_user_repo"))
+            mock_repo = mock_repo_class.return_value
+            mock_repo.bare = True
+
+            fetch_repository(
+                "https://github.com/user/repo.git",
+                output_dir,
+                MagicMock(),
+                SyncOptions(mirror=True),
+            )
+            mock_repo.git.execute.assert_called_once_with(
+                ["git", "remote", "update", "--prune"]
+            )
+            mock_repo.git.fetch.assert_not_called()
+
+    @patch("downloader.Repo")
+    def test_mode_mismatch_is_rejected(self, mock_repo_class):
+        """Test a working-tree clone is not silently updated as a mirror."""
+        with tempfile.TemporaryDirectory() as output_dir:
+            os.makedirs(os.path.join(output_dir, "_user_repo"))
+            mock_repo_class.return_value.bare = False
+
+            with pytest.raises(ValueError):
+                fetch_repository(
+                    "https://github.com/user/repo.git",
+                    output_dir,
+                    MagicMock(),
+                    SyncOptions(mirror=True),
+                )
+
+    @patch("downloader.Repo")
+    def test_new_repo_is_cloned_without_fetch(self, mock_repo_class):
+        """Test a missing repository is cloned and not fetched again."""
+        with tempfile.TemporaryDirectory() as output_dir:
+            git_repo = fetch_repository(
+                "https://github.com/user/repo.git", output_dir, MagicMock()
+            )
+            mock_repo_class.clone_from.assert_called_once_with(
+                "https://github.com/user/repo.git",
+                os.path.join(output_dir, "_user_repo"),
+                multi_options=[],
+            )
+            assert git_repo is mock_repo_class.clone_from.return_value
+            git_repo.git.fetch.assert_not_called()
+
+
+class TestRunRepositories:
+    """Test cases for run_repositories function."""
+
+    REPOS = [
+        "https://github.com/user/one.git",
+        "https://github.com/user/two.git",
+        "https://github.com/user/three.git",
+    ]
+
+    @patch("downloader.tqdm")
+    @patch("downloader.process_repository")
+    def test_workers_run_concurrently(self, mock_process, mock_tqdm):
+        """Test repositories are processed in parallel under one progress bar,
+        each worker logging through its own repository adapter."""
+        # Every call waits for all others, so this only returns if all
+        # repositories are in flight at the same time
+        barrier = threading.Barrier(len(self.REPOS), timeout=5)
+        loggers = {}
+
+        def process(github_client, repo_url, output_dir, logger, options):
+            loggers[repo_url] = logger
+            barrier.wait()
+            return None
+
+        mock_process.side_effect = process
+        logger = MagicMock()
+
+        durations = run_repositories(
+            MagicMock(), self.REPOS, "out", len(self.REPOS), logger
+        )
+
+        assert set(durations) == set(self.REPOS)
+        mock_tqdm.assert_called_once_with(
+            total=len(self.REPOS), desc="Processing repositories"
+        )
+        progress = mock_tqdm.return_value.__enter__.return_value
+        assert progress.update.call_count == len(self.REPOS)
+        for repo_url, repo_logger in loggers.items():
+            assert isinstance(repo_logger, RepoLoggerAdapter)
+            assert repo_logger.logger is logger
+            assert repo_logger.extra == {"repo": get_repo_slug(repo_url)}
+
+    @patch("downloader.tqdm")
+    @patch("downloader.process_repository")
+    def test_failures_do_not_stop_other_workers(self, mock_process, mock_tqdm):
+        """Test a failed repository still counts as processed."""
+        mock_process.side_effect = lambda client, url, *args: (
+            Exception("boom") if "two" in url else None
+        )
+
+        durations = run_repositories(MagicMock(), self.REPOS, "out", 2, MagicMock())
+
+        assert set(durations) == set(self.REPOS)
+        progress = mock_tqdm.return_value.__enter__.return_value
+        assert progress.update.call_count == len(self.REPOS)
+
+
+class TestProcessRepository:
+    """Test cases for process_repository."""
+
+    def test_clone_then_update(self, make_repo, commit):
+        """Test a repository is cloned and later picks up new commits and
+        branches."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            origin = make_repo(os.path.join(temp_dir, "origin"))
+            origin.git.branch("develop")
+            output_dir = os.path.join(temp_dir, "out")
+            options = SyncOptions()
+
+            for ref_only in (False, True):
+                options.ref_only = ref_only
+                assert (
+                    process_repository(
+                        None, origin.working_dir, output_dir, MagicMock(), options
+                    )
+                    is None
+                )
+                commit(origin, f"work {ref_only}")
+                origin.git.branch(f"feature-{ref_only}")
+
+            repo_dir = os.path.join(output_dir, os.listdir(output_dir)[0])
+            clone = Repo(repo_dir)
+            assert clone.active_branch.name == "main"
+            assert sorted(head.name for head in clone.heads) == [
+                "develop",
+                "feature-False",
+                "main",
+            ]
+            assert clone.heads.main.commit.message.strip() == "work False"
+
+    @pytest.mark.parametrize(
+        "ref_only, sparse",
+        [(False, False), (True, False), (False, True)],
+        ids=["branches", "ref-only", "sparse"],
+    )
+    def test_no_checkout_clone_is_checked_out_by_local_stage(
+        self, ref_only, sparse, make_repo
+    ):
+        """Test a --no-checkout clone gets no working tree in the network stage
+        and a clean one in the local stage."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            origin = make_repo(os.path.join(temp_dir, "origin"), message=None)
+            os.makedirs(os.path.join(origin.working_dir, "src"))
+            os.makedirs(os.path.join(origin.working_dir, "docs"))
+            for path in ("README.md", "src/app.py", "docs/guide.md"):
+                with open(os.path.join(origin.working_dir, path), "w") as f:
+                    f.write(path)
+            origin.git.add("-A")
+            origin.git.commit("-m", "init")
+            slug = get_repo_slug(origin.working_dir)
+            options = SyncOptions(ref_only=ref_only, no_checkout=True)
+            if sparse:
+                options.repo_configs = {slug.lower(): {"sparse_checkout": ["src"]}}
+            output_dir = os.path.join(temp_dir, "out")
+
+            clone = fetch_repository(
+                origin.working_dir, output_dir, MagicMock(), options
+            )
+            assert os.listdir(clone.working_dir) == [".git"]
+
+            materialize_repository(clone, origin.working_dir, MagicMock(), options)
+            assert clone.active_branch.name == "main"
+            assert os.path.exists(os.path.join(clone.working_dir, "src", "app.py"))
+            assert os.path.exists(os.path.join(clone.working_dir, "docs")) != sparse
+            assert clone.git.status("--porcelain") == ""
+
+    @pytest.mark.parametrize("mirror", [False, True], ids=["clone", "mirror"])
+    def test_update_follows_changed_default_branch(self, mirror, make_repo):
+        """Test an update picks up a new remote default branch even though
+        the cached default branch still names the old one."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            origin = make_repo(os.path.join(temp_dir, "origin"))
+            output_dir = os.path.join(temp_dir, "out")
+            options = SyncOptions(mirror=mirror)
+            process_repository(
+                None, origin.working_dir, output_dir, MagicMock(), options
+            )
+            slug = get_repo_slug(origin.working_dir)
+            assert options.default_branches[slug] == "main"
+
+            origin.git.checkout("-b", "dev")
+            process_repository(
+                None, origin.working_dir, output_dir, MagicMock(), options
+            )
+
+            clone = Repo(os.path.join(output_dir, os.listdir(output_dir)[0]))
+            assert options.default_branches[slug] == "dev"
+            assert get_default_branch(clone) == "dev"
+            if not mirror:
+                assert clone.active_branch.name == "dev"
+
+    def test_include_rule_keeps_default_branch(self, make_repo, commit):
+        """Test a filtered clone keeps updating the default branch when the
+        include rules do not select it."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            origin = make_repo(os.path.join(temp_dir, "origin"))
+            origin.git.branch("feature")
+            origin.git.branch("other")
+            output_dir = os.path.join(temp_dir, "out")
+            options = SyncOptions(ref_filter=RefFilter(include_branches=["feat*"]))
+
+            process_repository(
+                None, origin.working_dir, output_dir, MagicMock(), options
+            )
+            commit(origin, "work")
+            process_repository(
+                None, origin.working_dir, output_dir, MagicMock(), options
+            )
+
+            clone = Repo(os.path.join(output_dir, os.listdir(output_dir)[0]))
+            refs = RefSnapshot.read(clone.git_dir)
+            assert sorted(refs.with_prefix("refs/remotes/origin/")) == [
+                "feature",
+                "main",
+            ]
+            assert get_default_branch(clone) == "main"
+            assert clone.active_branch.name == "main"
+            assert clone.heads.main.commit == origin.heads.main.commit
+            assert clone.heads.main.tracking_branch().name == "origin/main"
+
+
+class TestRunPipeline:
+    """Test cases for run_pipeline function."""
+
+    REPOS = [f"https://github.com/user/repo{number}.git" for number in range(8)]
+
+    @patch("downloader.tqdm")
+    @patch("downloader.materialize_repository")
+    @patch("downloader.fetch_repository")
+    def test_repos_go_through_both_stages(self, mock_fetch, mock_materialize, _):
+        """Test each fetched repository is handed to the local stage."""
+        mock_fetch.side_effect = lambda url, *args: f"git_repo:{url}"
+
+        durations = run_pipeline(self.REPOS[:2], "out", 2, 2, MagicMock())
+
+        assert set(durations) == set(self.REPOS[:2])
+        assert sorted(call.args[:2] for call in mock_materialize.call_args_list) == [
+            (f"git_repo:{url}", url) for url in self.REPOS[:2]
+        ]
+        assert isinstance(mock_materialize.call_args.args[2], RepoLoggerAdapter)
+
+    @patch("downloader.tqdm")
+    @patch("downloader.materialize_repository")
+    @patch("downloader.fetch_repository")
+    def test_clones_without_checkout(self, mock_fetch, mock_materialize, _):
+        """Test the network stage clones without a checkout and both stages
+        share the run's other settings."""
+        options = SyncOptions(ref_only=True)
+
+        run_pipeline(self.REPOS[:1], "out", 1, 1, MagicMock(), options=options)
+
+        stage_options = mock_fetch.call_args.args[3]
+        assert stage_options.no_checkout and stage_options.ref_only
+        assert stage_options.default_branches is options.default_branches
+        assert mock_materialize.call_args.args[3] is stage_options
+        assert not options.no_checkout
+
+    @patch("downloader.tqdm")
+    @patch("downloader.materialize_repository")
+    @patch("downloader.fetch_repository")
+    def test_failed_and_skipped_fetches_advance_progress(
+        self, mock_fetch, mock_materialize, mock_tqdm
+    ):
+        """Test a fetch failure or a skipped (None) repository is finished in
+        the fetch stage and never reaches the local stage."""
+        failing, skipped, fetched = self.REPOS[:3]
+
+        def fetch(url, *args):
+            if url == failing:
+                raise GitCommandError(["git", "fetch"], 128)
+            return None if url == skipped else MagicMock()
+
+        mock_fetch.side_effect = fetch
+
+        durations = run_pipeline(self.REPOS[:3], "out", 2, 1, MagicMock())
+
+        assert set(durations) == set(self.REPOS[:3])
+        assert mock_tqdm.return_value.update.call_count == 3
+        mock_materialize.assert_called_once()
+        assert mock_materialize.call_args.args[1] == fetched
+
+    @patch("downloader.tqdm")
+    @patch("downloader.materialize_repository")
+    @patch("downloader.fetch_repository")
+    def test_shutdown_with_full_queues(self, mock_fetch, mock_materialize, mock_tqdm):
+        """Test more repositories than the bounded queues hold, behind a slow
+        local stage, all finish and every worker thread exits."""
+        threads_before = threading.active_count()
+        mock_fetch.return_value = MagicMock()
+        mock_materialize.side_effect = lambda *args: time.sleep(0.01)
+
+        durations = run_pipeline(self.REPOS, "out", 1, 1, MagicMock())
+
+        assert set(durations) == set(self.REPOS)
+        assert mock_materialize.call_count == len(self.REPOS)
+        assert mock_tqdm.return_value.update.call_count == len(self.REPOS)
+        mock_tqdm.return_value.close.assert_called_once()
+        assert threading.active_count() == threads_before
+
+
+class TestRunQueueWorkers:
+    """Test cases for run_queue_workers function."""
+
+    REPOS = [f"https://github.com/user/repo{number}.git" for number in range(5)]
+
+    @patch("downloader.tqdm")
+    @patch("downloader.process_repository")
+    def test_workers_drain_the_queue(self, mock_process, mock_tqdm):
+        """Test workers claim every repository once and record failures."""
+        mock_process.side_effect = lambda client, url, *args: (
+            Exception("boom") if url == self.REPOS[1] else None
+        )
+        with tempfile.TemporaryDirectory() as temp_dir:
+            work_queue = WorkQueue(os.path.join(temp_dir, "queue.db"))
+            work_queue.add(self.REPOS)
+
+            durations = run_queue_workers(
+                MagicMock(), work_queue, "out", 3, MagicMock()
+            )
+
+            assert set(durations) == set(self.REPOS)
+            assert sorted(call.args[1] for call in mock_process.call_args_list) == (
+                sorted(self.REPOS)
+            )
+            assert work_queue.counts() == {"done": 4, "failed": 1}
+            mock_tqdm.assert_called_once_with(
+                total=len(self.REPOS), desc="Processing repositories"
+            )
+            assert mock_tqdm.return_value.update.call_count == len(self.REPOS)
+
+    @patch("downloader.tqdm")
+    @patch("downloader.process_repository")
+    def test_lost_lease_is_left_to_new_owner(self, mock_process, _):
+        """Test a repository whose lease was taken over while it was processed
+        is not marked done by the worker that lost it."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            work_queue = WorkQueue(
+                os.path.join(temp_dir, "queue.db"), lease_seconds=0.3
+            )
+            work_queue.add(self.REPOS[:1])
+
+            def steal_lease(*args):
+                with sqlite3.connect(work_queue.path) as connection:
+                    connection.execute(
+                        "UPDATE repos SET worker = 'other', "
+                        "lease_expires = lease_expires + 3600"
+                    )
+                time.sleep(0.25)
+
+            mock_process.side_effect = steal_lease
+            logger = MagicMock()
+
+            run_queue_workers(MagicMock(), work_queue, "out", 1, logger)
+
+            assert work_queue.counts() == {"leased": 1}
+            warnings = [
+                call for call in logger.log.call_args_list if call.args[0] == 30
+            ]
+            assert len(warnings) == 2
+
+
+class TestRunState:
+    """Test cases for saving run state shared by several processes."""
+
+    def test_concurrent_runs_keep_each_others_values(self):
+        """Test a process only writes the values it changed over the state
+        saved by another process meanwhile."""
+        with tempfile.TemporaryDirectory() as output_dir:
+            logger = MagicMock()
+            save_run_state(output_dir, {"repos": {"user/a": {"duration": 1.0}}}, logger)
+            first = load_run_state(output_dir, logger)
+            second = load_run_state(output_dir, logger)
+            first_loaded = copy.deepcopy(first)
+            second_loaded = copy.deepcopy(second)
+
+            first["repos"]["user/b"] = {"duration": 2.0, "default_branch": "main"}
+            second["repos"]["user/a"]["duration"] = 3.0
+            second["repos"]["user/c"] = {"duration": 4.0}
+            save_run_state(output_dir, first, logger, first_loaded)
+            save_run_state(output_dir, second, logger, second_loaded)
+
+            assert load_run_state(output_dir, logger) == {
+                "repos": {
+                    "user/a": {"duration": 3.0},
+                    "user/b": {"duration": 2.0, "default_branch": "main"},
+                    "user/c": {"duration": 4.0},
+                }
+            }
+            assert not [name for name in os.listdir(output_dir) if "tmp" in name]
+            logger.error.assert_not_called()
 
 
 class TestCleanUntrackedFiles:
@@ -170,6 +951,139 @@ class TestCleanUntrackedFiles:
         )
 
 
+class TestLongestFirstScheduling:
+    """Test cases for size and duration based scheduling."""
+
+    def test_estimate_costs_prefers_recorded_duration(self):
+        """Test recorded durations win over sizes and sizes are scaled."""
+        repos = [
+            "git@github.com:org/small.git",
+            "git@github.com:org/big.git",
+            "git@github.com:org/new.git",
+        ]
+        repo_state = {
+            "org/small": {"duration": 2.0, "size": 100},
+            "org/big": {"size": 1000},
+        }
+
+        costs = estimate_repo_costs(repos, repo_state)
+        assert costs == {repos[0]: 2.0, repos[1]: 20.0, repos[2]: 0.0}
+
+    def test_order_longest_first_uses_api_sizes(self):
+        """Test unknown repositories are sized through the GitHub API."""
+        github_client = MagicMock()
+        github_client.get.side_effect = lambda path: (
+            {
+                "size": {"/repos/org/a": 10, "/repos/org/b": 5000}[path],
+                "default_branch": "main",
+                "fork": False,
+                "full_name": path[len("/repos/") :],
+            },
+            {},
+        )
+        repos = ["git@github.com:org/a.git", "git@github.com:org/b.git"]
+        state = {"repos": {}}
+
+        result = order_longest_first(github_client, repos, state, 2, MagicMock())
+        assert result == ["git@github.com:org/b.git", "git@github.com:org/a.git"]
+        assert state["repos"]["org/b"] == {
+            "size": 5000,
+            "default_branch": "main",
+            "network": "org/b",
+        }
+
+    def test_resolve_fork_networks(self):
+        """Test forks are grouped under the repository they were forked from."""
+        upstream = {"full_name": "Upstream/Project"}
+        github_client = MagicMock()
+        github_client.get.return_value = (
+            {"size": 1, "default_branch": "main", "fork": True, "source": upstream},
+            {},
+        )
+        repos = [
+            "git@github.com:alice/project.git",
+            "git@github.com:bob/project.git",
+            "https://gitlab.com/carol/project.git",
+        ]
+        state = {"repos": {"alice/project": {"network": "upstream/project"}}}
+
+        networks = resolve_fork_networks(github_client, repos, state, 2, MagicMock())
+        assert networks == {
+            "alice/project": "upstream/project",
+            "bob/project": "upstream/project",
+            "carol/project": "carol/project",
+        }
+        github_client.get.assert_called_once_with("/repos/bob/project")
+
+    def test_default_branches_round_trip_through_state(self):
+        """Test cached default branches are loaded from and saved to state."""
+        state = {"repos": {"org/a": {"size": 10, "default_branch": "trunk"}}}
+        default_branches = load_default_branches(state)
+        assert default_branches == {"org/a": "trunk"}
+
+        default_branches["org/b"] = "main"
+        record_default_branches(state, default_branches)
+        assert state["repos"]["org/b"] == {"default_branch": "main"}
+
+    def test_listing_metadata_avoids_api_lookups(self):
+        """Test metadata from the GraphQL listing fills the state before any
+        API lookup."""
+        github_client = MagicMock()
+        repos = ["git@github.com:Org/A.git", "git@github.com:org/b.git"]
+        metadata = {
+            "org/a": {"size": 10, "default_branch": "trunk", "network": "up/a"},
+            "org/b": {"size": 5000, "default_branch": None, "archived": True},
+        }
+        state = {"repos": {"Org/A": {"default_branch": "old", "duration": 1.0}}}
+
+        assert apply_repo_metadata(repos, metadata, state) == 2
+        assert state["repos"] == {
+            "Org/A": {
+                "default_branch": "trunk",
+                "duration": 1.0,
+                "network": "up/a",
+                "size": 10,
+            },
+            "org/b": {"size": 5000},
+        }
+        result = order_longest_first(github_client, repos, state, 2, MagicMock())
+        assert result == [repos[1], repos[0]]
+        github_client.get.assert_not_called()
+
+    def test_record_durations(self):
+        """Test durations are stored by repository slug."""
+        state = {"repos": {"org/a": {"size": 10}}}
+        record_durations(state, {"git@github.com:org/a.git": 1.23456})
+        assert state["repos"]["org/a"] == {"size": 10, "duration": 1.235}
+
+
+class TestSharding:
+    """Test cases for repository sharding across nodes."""
+
+    REPOS = [f"git@github.com:org/repo{i}.git" for i in range(200)]
+
+    def test_shard_ignores_url_format_and_case(self):
+        """Test SSH and HTTPS URLs of the same repo land on the same shard."""
+        ssh = get_repo_shard("git@github.com:Org/Repo.git", 7)
+        https = get_repo_shard("https://github.com/org/repo", 7)
+        assert ssh == https
+
+    def test_shards_partition_repos(self):
+        """Test every repository is assigned to exactly one shard."""
+        shards = [filter_shard(self.REPOS, i, 4, MagicMock()) for i in range(1, 5)]
+        assert sorted(sum(shards, [])) == sorted(self.REPOS)
+        assert all(shards)
+
+    def test_adding_shard_moves_few_repos(self):
+        """Test growing from 4 to 5 shards only moves repos to the new shard."""
+        before = {repo: get_repo_shard(repo, 4) for repo in self.REPOS}
+        after = {repo: get_repo_shard(repo, 5) for repo in self.REPOS}
+        moved = [repo for repo in self.REPOS if before[repo] != after[repo]]
+
+        assert all(after[repo] == 5 for repo in moved)
+        assert len(moved) < len(self.REPOS) / 3
+
+
 class TestParseArgs:
     """Test cases for parse_args function."""
 
@@ -180,6 +1094,7 @@ class TestParseArgs:
         assert args.input == "repos.txt"
         assert args.output == "./repos"
         assert args.token is None
+        assert args.jobs == 1
 
     @patch(
         "sys.argv",
@@ -200,6 +1115,83 @@ class TestParseArgs:
         assert args.output == "/tmp/repos"
         assert args.token == "ghp_token123"
 
+    @patch("sys.argv", ["downloader.py", "--input", "repos.txt", "--jobs", "8"])
+    def test_parse_args_jobs(self):
+        """Test parsing the parallel jobs option."""
+        args = parse_args()
+        assert args.jobs == 8
+
+    @patch(
+        "sys.argv",
+        ["downloader.py", "--input", "repos.txt", "--pipeline", "--local-jobs", "3"],
+    )
+    def test_parse_args_pipeline(self):
+        """Test parsing the two-stage pipeline options."""
+        args = parse_args()
+        assert args.pipeline
+        assert args.local_jobs == 3
+
+    @patch("sys.argv", ["downloader.py", "--input", "repos.txt", "--shard", "2/5"])
+    def test_parse_args_shard(self):
+        """Test parsing a shard specification."""
+        args = parse_args()
+        assert args.shard == (2, 5)
+
+    @patch("sys.argv", ["downloader.py", "--input", "repos.txt", "--shard", "6/5"])
+    def test_parse_args_shard_out_of_range(self):
+        """Test that a shard index above the shard count is rejected."""
+        with pytest.raises(SystemExit):
+            parse_args()
+
+    @patch(
+        "sys.argv",
+        ["downloader.py", "--input", "repos.txt", "--partial-clone", "treeless"],
+    )
+    def test_parse_args_partial_clone(self):
+        """Test parsing the partial clone option."""
+        args = parse_args()
+        assert args.partial_clone == "treeless"
+
+    @patch(
+        "sys.argv",
+        [
+            "downloader.py",
+            "--input",
+            "repos.txt",
+            "--depth",
+            "1",
+            "--shallow-since",
+            "x",
+        ],
+    )
+    def test_parse_args_history_limits_exclusive(self):
+        """Test depth and since-date limits cannot be combined."""
+        with pytest.raises(SystemExit):
+            parse_args()
+
+    @patch(
+        "sys.argv",
+        [
+            "downloader.py",
+            "--input",
+            "repos.txt",
+            "--object-pool",
+            "pool",
+            "--partial-clone",
+            "blobless",
+        ],
+    )
+    def test_parse_args_object_pool_needs_complete_objects(self):
+        """Test object pools cannot be combined with partial clones."""
+        with pytest.raises(SystemExit):
+            parse_args()
+
+    @patch("sys.argv", ["downloader.py", "--input", "repos.txt", "--jobs", "0"])
+    def test_parse_args_jobs_must_be_positive(self):
+        """Test that a zero job count is rejected."""
+        with pytest.raises(SystemExit):
+            parse_args()
+
     @patch("sys.argv", ["downloader.py"])
     def test_parse_args_missing_required(self):
         """Test parsing with missing required argument."""
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import tempfile
+from unittest.mock import MagicMock
+
+import pytest
+from git import Repo
+
+# Add src directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from downloader import SyncOptions, fetch_repository, get_seed_bundle
+from export_bundles import export_bundle, find_repositories
+
+
+@pytest.fixture
+def output_tree(make_repo):
+    """A downloader output directory holding one clone of an origin repo."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        origin = make_repo(os.path.join(temp_dir, "origin"))
+        origin.git.tag("v1")
+
+        output_dir = os.path.join(temp_dir, "repos")
+        Repo.clone_from(origin.working_dir, os.path.join(output_dir, "org_project"))
+        with open(os.path.join(output_dir, ".downloader_state.json"), "w") as f:
+            f.write("{}")
+        yield temp_dir, origin, output_dir
+
+
+class TestExportBundles:
+    """Test cases for exporting and seeding from bundles."""
+
+    def test_find_repositories_skips_state_file(self, output_tree):
+        """Test only repository directories are exported."""
+        _, _, output_dir = output_tree
+        assert find_repositories(output_dir) == [
+            os.path.join(output_dir, "org_project")
+        ]
+
+    def test_exported_bundle_seeds_clone(self, output_tree):
+        """Test a clone seeded from an exported bundle tracks the real remote."""
+        temp_dir, origin, output_dir = output_tree
+        bundle_dir = os.path.join(temp_dir, "bundles")
+        os.makedirs(bundle_dir)
+
+        assert (
+            export_bundle(
+                os.path.join(output_dir, "org_project"), bundle_dir, MagicMock()
+            )
+            is None
+        )
+        new_output = os.path.join(temp_dir, "node2")
+        repo_dir = os.path.join(new_output, "org_project")
+        assert get_seed_bundle(bundle_dir, repo_dir) == os.path.join(
+            bundle_dir, "org_project.bundle"
+        )
+
+        with pytest.MonkeyPatch.context() as monkeypatch:
+            # Clone into the directory name the bundle was exported from
+            monkeypatch.setattr(
+                "downloader.get_repo_name_from_url", lambda url: "org/project"
+            )
+            git_repo = fetch_repository(
+                f"file://{origin.working_dir}",
+                new_output,
+                MagicMock(),
+                SyncOptions(bundle_dir=bundle_dir),
+            )
+
+        assert git_repo.remote().url == f"file://{origin.working_dir}"
+        assert git_repo.git.for_each_ref("refs/bundles") == ""
+        assert [tag.name for tag in git_repo.tags] == ["v1"]
+
+    def test_partial_clone_is_not_exported(self, output_tree):
+        """Test a blobless clone is rejected instead of fetching its missing
+        objects while bundling."""
+        temp_dir, origin, output_dir = output_tree
+        with origin.config_writer() as config:
+            config.set_value("uploadpack", "allowFilter", "true")
+        repo_dir = os.path.join(output_dir, "org_partial")
+        Repo.clone_from(
+            f"file://{origin.working_dir}",
+            repo_dir,
+            multi_options=["--filter=blob:none"],
+        )
+        bundle_dir = os.path.join(temp_dir, "bundles")
+        os.makedirs(bundle_dir)
+
+        error = export_bundle(repo_dir, bundle_dir, MagicMock())
+        assert isinstance(error, ValueError)
+        assert os.listdir(bundle_dir) == []
+
+    def test_missing_bundle_is_ignored(self):
+        """Test repositories without a bundle are cloned normally."""
+        with tempfile.TemporaryDirectory() as bundle_dir:
+            assert get_seed_bundle(bundle_dir, "/repos/org_other") is None
+        assert get_seed_bundle(None, "/repos/org_other") is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import tempfile
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+# Add src directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from github_api import GitHubApi, ResponseCache, TokenBucket
+
+
+def response(status, body=None, headers=None):
+    """Return a mocked requests response."""
+    mock_response = MagicMock(status_code=status, headers=headers or {}, text="")
+    mock_response.json.return_value = body
+    return mock_response
+
+
+@pytest.fixture
+def cache_dir():
+    """A temporary cache directory."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        yield temp_dir
+
+
+class TestConditionalRequests:
+    """Test cases for GitHubApi GET requests through a ResponseCache."""
+
+    def test_not_modified_is_served_from_disk(self, cache_dir):
+        """Test a 304 answer returns the stored body and Link header."""
+        api = GitHubApi("token", ResponseCache(cache_dir, 1024 * 1024, 3600))
+        api.session = MagicMock()
+        link = '<https://api.github.com/orgs/o/repos?page=2>; rel="last"'
+        api.session.request.side_effect = [
+            response(200, [{"name": "a"}], {"ETag": '"v1"', "Link": link}),
+            response(304),
+        ]
+
+        assert api.get("/orgs/o/repos", {"page": 1})[0] == [{"name": "a"}]
+        body, headers = api.get("/orgs/o/repos", {"page": 1})
+        assert body == [{"name": "a"}]
+        assert headers == {"Link": link}
+        assert api.session.request.call_args.kwargs["headers"] == {
+            "If-None-Match": '"v1"'
+        }
+        assert api.stats["requests"] == 2
+        assert api.stats["cache_hits"] == 1
+        assert api.stats["cache_misses"] == 1
+
+    def test_cache_is_keyed_by_url_and_token(self, cache_dir):
+        """Test other pages and other tokens do not reuse an entry."""
+        cache = ResponseCache(cache_dir, 1024 * 1024, 3600)
+        api = GitHubApi("token", cache)
+        api.session = MagicMock()
+        api.session.request.return_value = response(200, [], {"Last-Modified": "x"})
+        api.get("/orgs/o/repos", {"page": 1})
+
+        api.get("/orgs/o/repos", {"page": 2})
+        assert api.session.request.call_args.kwargs["headers"] == {}
+        other = GitHubApi("other", cache)
+        other.session = api.session
+        other.get("/orgs/o/repos", {"page": 1})
+        assert api.session.request.call_args.kwargs["headers"] == {}
+
+    def test_responses_without_validators_are_not_stored(self, cache_dir):
+        """Test only responses with an ETag or Last-Modified are cached."""
+        cache = ResponseCache(cache_dir, 1024 * 1024, 3600)
+        cache.put("key", {}, {"a": 1})
+        assert cache.get("key") is None
+
+
+def quota(remaining, reset_in=60, limit=5000, resource="core"):
+    """Return X-RateLimit headers."""
+    return {
+        "X-RateLimit-Limit": str(limit),
+        "X-RateLimit-Remaining": str(remaining),
+        "X-RateLimit-Reset": str(int(time.time() + reset_in)),
+        "X-RateLimit-Resource": resource,
+    }
+
+
+class TestRateLimits:
+    """Test cases for rate limit handling in GitHubApi."""
+
+    def _api(self, *responses):
+        api = GitHubApi("token", logger=MagicMock())
+        api.session = MagicMock()
+        api.session.request.side_effect = list(responses)
+        return api
+
+    @patch("github_api.time.sleep")
+    def test_exhausted_quota_waits_for_reset(self, mock_sleep):
+        """Test a primary rate limit answer is retried after the reset."""
+        api = self._api(
+            response(403, None, quota(0, reset_in=30)),
+            response(200, {"ok": True}, quota(4999, reset_in=3600)),
+        )
+
+        assert api.get("/orgs/o/repos")[0] == {"ok": True}
+        assert 30 <= mock_sleep.call_args_list[-1].args[0] <= 32
+        assert api.stats["rate_limit_waits"] == 1
+        assert api.rate_limits["core"]["remaining"] == 4999
+
+    @patch("github_api.time.sleep")
+    def test_secondary_limit_honours_retry_after(self, mock_sleep):
+        """Test Retry-After is used for secondary rate limit answers."""
+        api = self._api(
+            response(429, None, {"Retry-After": "7"}),
+            response(200, [], quota(10)),
+        )
+
+        api.get("/orgs/o/repos")
+        mock_sleep.assert_any_call(7.0)
+        assert api.stats["secondary_backoffs"] == 1
+
+    @patch("github_api.time.sleep")
+    def test_secondary_limit_backs_off_exponentially(self, mock_sleep):
+        """Test secondary limits without Retry-After back off from a minute."""
+        limited = response(403)
+        limited.text = "You have exceeded a secondary rate limit"
+        api = self._api(limited, limited, response(200, [], {}))
+
+        api.get("/orgs/o/repos")
+        assert [c.args[0] for c in mock_sleep.call_args_list if c.args[0] >= 1] == [
+            60.0,
+            120.0,
+        ]
+
+    @patch("github_api.time.sleep")
+    def test_graphql_rate_limited_error_is_retried(self, mock_sleep):
+        """Test GraphQL quota errors in 200 answers wait for the reset."""
+        limited = response(200, None, quota(0, resource="graphql"))
+        limited.text = '{"errors": [{"type": "RATE_LIMITED"}]}'
+        api = self._api(limited, response(200, {"data": {"a": 1}}, {}))
+
+        assert api.graphql("query", {}) == {"a": 1}
+        assert api.stats["rate_limit_waits"] == 1
+
+    def test_forbidden_is_not_retried(self):
+        """Test other 403 answers are raised without retrying."""
+        forbidden = response(403, None, quota(4000))
+        forbidden.raise_for_status.side_effect = RuntimeError("403 Forbidden")
+        api = self._api(forbidden)
+
+        with pytest.raises(RuntimeError):
+            api.get("/orgs/private/repos")
+        assert api.stats["requests"] == 1
+
+    def test_low_quota_slows_the_bucket(self):
+        """Test requests are spread until the reset when little quota is left."""
+        api = self._api(response(200, [], quota(100, reset_in=1000)))
+        api.get("/orgs/o/repos")
+        assert api.bucket.rate == pytest.approx(0.1, rel=0.05)
+        assert "100/5000 remaining" in api.describe_rate_limit()[1]
+
+
+class TestTokenBucket:
+    """Test cases for TokenBucket class."""
+
+    @patch("github_api.time.sleep")
+    def test_bursts_then_paces(self, mock_sleep):
+        """Test the capacity is available at once and later tokens are paced."""
+        bucket = TokenBucket(rate=2.0, capacity=2)
+        assert bucket.acquire() == 0.0
+        assert bucket.acquire() == 0.0
+        assert bucket.acquire() == pytest.approx(0.5, abs=0.01)
+        assert bucket.acquire() == pytest.approx(1.0, abs=0.01)
+
+
+class TestResponseCacheEviction:
+    """Test cases for ResponseCache.evict."""
+
+    def test_expired_entries_are_evicted(self, cache_dir):
+        """Test entries older than the maximum age are dropped."""
+        cache = ResponseCache(cache_dir, 1024 * 1024, 60)
+        cache.put("old", {"ETag": "a"}, [])
+        cache.put("new", {"ETag": "b"}, [])
+        old_time = time.time() - 120
+        os.utime(cache._entry_path("old"), (old_time, old_time))
+
+        assert cache.get("old") is None
+        assert cache.evict() == (1, 1)
+        assert cache.get("new") is not None
+
+    def test_oldest_entries_are_evicted_over_size(self, cache_dir):
+        """Test the oldest entries go first when over the size bound."""
+        cache = ResponseCache(cache_dir, 250, 3600)
+        for i in range(3):
+            cache.put(f"key{i}", {"ETag": str(i)}, ["x" * 50])
+            mtime = time.time() - 10 + i
+            os.utime(cache._entry_path(f"key{i}"), (mtime, mtime))
+
+        remaining, evicted = cache.evict()
+        assert (remaining, evicted) == (2, 1)
+        assert cache.get("key0") is None
+        assert cache.get("key2") is not None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import tempfile
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+# Add src directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from list_org_repos import (
+    get_org_repos,
+    get_org_repos_graphql,
+    get_org_repos_pushed_since,
+    load_last_run,
+    save_last_run,
+)
+
+
+def mock_api(repo_count, per_page=3):
+    """Return an API client whose organization lists ``repo_count`` repos."""
+    repos = [{"name": f"repo{i:02d}"} for i in range(repo_count)]
+    page_count = max(1, -(-repo_count // per_page))
+
+    def get(path, params):
+        page = params["page"]
+        # Later pages answer first, the result must keep the API order
+        time.sleep(0.01 * (5 - page) if page < 5 else 0)
+        headers = {}
+        if page == 1 and page_count > 1:
+            headers["Link"] = (
+                f'<https://api.github.com{path}?per_page=100&page=2>; rel="next", '
+                f"<https://api.github.com{path}?per_page=100&page={page_count}>; "
+                'rel="last"'
+            )
+        return repos[(page - 1) * per_page : page * per_page], headers
+
+    api = MagicMock()
+    api.get.side_effect = get
+    return api
+
+
+class TestGetOrgRepos:
+    """Test cases for get_org_repos function."""
+
+    def test_pages_fetched_concurrently_in_order(self):
+        """Test the remaining pages are fetched in parallel in a stable order."""
+        api = mock_api(13)
+
+        repos = get_org_repos(api, "org", jobs=4)
+        assert repos == [f"git@github.com:org/repo{i:02d}.git" for i in range(13)]
+        assert sorted(c.args[1]["page"] for c in api.get.call_args_list) == [
+            1,
+            2,
+            3,
+            4,
+            5,
+        ]
+        assert all(c.args[1]["per_page"] == 100 for c in api.get.call_args_list)
+
+    def test_single_page(self):
+        """Test a listing without a last page link needs a single request."""
+        api = mock_api(2)
+
+        assert get_org_repos(api, "org", jobs=4) == [
+            "git@github.com:org/repo00.git",
+            "git@github.com:org/repo01.git",
+        ]
+        api.get.assert_called_once()
+
+    def test_shifted_pages_are_deduplicated(self):
+        """Test a repository repeated across shifted pages is listed once."""
+        api = mock_api(6)
+        first, first_headers = api.get("/orgs/org/repos", {"page": 1})
+        second, _ = api.get("/orgs/org/repos", {"page": 2})
+        api.get.side_effect = [(first, first_headers), ([first[-1]] + second[:2], {})]
+
+        assert get_org_repos(api, "org") == [
+            f"git@github.com:org/repo{i:02d}.git" for i in range(5)
+        ]
+
+    def test_errors_exit(self):
+        """Test API errors stop the listing."""
+        api = MagicMock()
+        api.get.side_effect = RuntimeError("404 Not Found")
+        with pytest.raises(SystemExit):
+            get_org_repos(api, "missing")
+
+
+class TestChangedSinceLastRun:
+    """Test cases for the incremental listing of recently pushed repos."""
+
+    def test_stops_at_first_older_repository(self):
+        """Test pages sorted by push date are read only up to older repos."""
+        pages = {
+            1: [
+                {"name": "new", "pushed_at": "2024-05-02T10:00:00Z"},
+                {"name": "same", "pushed_at": "2024-05-01T00:00:00Z"},
+            ],
+            2: [
+                {"name": "recent", "pushed_at": "2024-05-01T00:00:00Z"},
+                {"name": "old", "pushed_at": "2024-04-30T23:59:59Z"},
+            ],
+        }
+        api = MagicMock()
+        link = '<https://api.github.com/x?page=9>; rel="last"'
+        api.get.side_effect = lambda path, params: (
+            pages[params["page"]],
+            {"Link": link},
+        )
+
+        repos = get_org_repos_pushed_since(api, "org", "2024-05-01T00:00:00Z")
+        assert repos == [
+            "git@github.com:org/new.git",
+            "git@github.com:org/same.git",
+            "git@github.com:org/recent.git",
+        ]
+        assert api.get.call_count == 2
+        params = api.get.call_args.args[1]
+        assert (params["sort"], params["direction"]) == ("pushed", "desc")
+
+    def test_empty_repositories_end_the_listing(self):
+        """Test repositories never pushed to count as older."""
+        api = MagicMock()
+        api.get.return_value = ([{"name": "empty", "pushed_at": None}], {})
+        assert get_org_repos_pushed_since(api, "org", "2024-05-01T00:00:00Z") == []
+
+    def test_last_run_round_trip(self):
+        """Test the last run time is stored per organization."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            state_file = os.path.join(temp_dir, "state.json")
+            assert load_last_run(state_file, "Org") is None
+            save_last_run(state_file, "Org", "2024-05-01T00:00:00Z")
+            save_last_run(state_file, "other", "2024-05-02T00:00:00Z")
+            assert load_last_run(state_file, "org") == "2024-05-01T00:00:00Z"
+
+
+def graphql_page(nodes, end_cursor=None):
+    """Return the GraphQL data holding one page of repositories."""
+    return {
+        "organization": {
+            "repositories": {
+                "totalCount": 3,
+                "pageInfo": {
+                    "hasNextPage": end_cursor is not None,
+                    "endCursor": end_cursor,
+                },
+                "nodes": nodes,
+            }
+        }
+    }
+
+
+def graphql_node(name, fork=False, parent=None, default_branch="main"):
+    """Return a repository node as returned by the GraphQL query."""
+    return {
+        "nameWithOwner": f"Org/{name}",
+        "sshUrl": f"git@github.com:Org/{name}.git",
+        "url": f"https://github.com/Org/{name}",
+        "defaultBranchRef": {"name": default_branch} if default_branch else None,
+        "diskUsage": 42,
+        "pushedAt": "2024-01-01T00:00:00Z",
+        "isFork": fork,
+        "isArchived": False,
+        "parent": parent,
+    }
+
+
+class TestGetOrgReposGraphql:
+    """Test cases for get_org_repos_graphql function."""
+
+    def test_paginates_with_cursor_and_collects_metadata(self):
+        """Test pages are followed by cursor and metadata is keyed by slug."""
+        api = MagicMock()
+        api.graphql.side_effect = [
+            graphql_page(
+                [
+                    graphql_node("app", default_branch="trunk"),
+                    graphql_node(
+                        "fork",
+                        fork=True,
+                        parent={"nameWithOwner": "Up/Project", "isFork": False},
+                    ),
+                ],
+                end_cursor="c1",
+            ),
+            graphql_page(
+                [
+                    graphql_node(
+                        "nested",
+                        fork=True,
+                        parent={"nameWithOwner": "Someone/fork", "isFork": True},
+                        default_branch=None,
+                    )
+                ]
+            ),
+        ]
+
+        repos, metadata = get_org_repos_graphql(api, "org")
+        assert repos == [
+            "git@github.com:Org/app.git",
+            "git@github.com:Org/fork.git",
+            "git@github.com:Org/nested.git",
+        ]
+        assert api.graphql.call_count == 2
+        assert api.graphql.call_args_list[1].args[1] == {
+            "org": "org",
+            "cursor": "c1",
+            "orderBy": {"field": "NAME", "direction": "ASC"},
+        }
+
+        assert metadata["Org/app"]["default_branch"] == "trunk"
+        assert metadata["Org/app"]["size"] == 42
+        assert metadata["Org/app"]["network"] == "org/app"
+        assert metadata["Org/fork"]["parent"] == "Up/Project"
+        assert metadata["Org/fork"]["network"] == "up/project"
+        assert metadata["Org/nested"]["default_branch"] is None
+        assert "network" not in metadata["Org/nested"]
+
+    def test_pushed_since_orders_by_push_and_stops(self):
+        """Test the incremental GraphQL listing stops at older repositories."""
+        old_node = graphql_node("old")
+        old_node["pushedAt"] = "2023-01-01T00:00:00Z"
+        api = MagicMock()
+        api.graphql.return_value = graphql_page(
+            [graphql_node("app"), old_node], end_cursor="c1"
+        )
+
+        repos, metadata = get_org_repos_graphql(api, "org", "2024-01-01T00:00:00Z")
+        assert repos == ["git@github.com:Org/app.git"]
+        assert list(metadata) == ["Org/app"]
+        api.graphql.assert_called_once()
+        assert api.graphql.call_args.args[1]["orderBy"] == {
+            "field": "PUSHED_AT",
+            "direction": "DESC",
+        }
+
+    def test_graphql_errors_exit(self):
+        """Test errors reported by the GraphQL API stop the listing."""
+        api = MagicMock()
+        api.graphql.side_effect = RuntimeError("Could not resolve to an Organization")
+
+        with pytest.raises(SystemExit):
+            get_org_repos_graphql(api, "missing")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
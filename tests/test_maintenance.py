@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import tempfile
+from unittest.mock import MagicMock
+
+import pytest
+
+# Add src directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from maintenance import (
+    MaintenanceScheduler,
+    MaintenanceThresholds,
+    plan_maintenance,
+    repository_stats,
+)
+
+HEALTHY = {
+    "loose_objects": 10,
+    "packs": 2,
+    "loose_refs": 5,
+    "multi_pack_index": 1,
+    "commit_graph_stale": 0,
+}
+
+
+@pytest.fixture
+def repo(make_repo, commit):
+    """A repository with a few loose objects and no commit-graph."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        git_repo = make_repo(temp_dir, message=None)
+        for i in range(3):
+            commit(git_repo, f"commit {i}")
+        yield git_repo
+
+
+class TestPlanMaintenance:
+    """Test cases for plan_maintenance function."""
+
+    def test_healthy_repository_needs_nothing(self):
+        """Test a repository under every threshold is left alone."""
+        assert plan_maintenance(HEALTHY, MaintenanceThresholds()) == []
+
+    def test_many_small_packs_trigger_repack(self):
+        """Test too many packs schedule a geometric repack and commit-graph."""
+        stats = {**HEALTHY, "packs": 30}
+        assert plan_maintenance(stats, MaintenanceThresholds()) == [
+            "repack",
+            "commit-graph",
+        ]
+
+    def test_loose_objects_and_refs(self):
+        """Test loose objects and loose refs are compacted."""
+        stats = {**HEALTHY, "loose_objects": 5000, "loose_refs": 2000}
+        assert plan_maintenance(stats, MaintenanceThresholds()) == [
+            "pack-refs",
+            "repack",
+            "commit-graph",
+        ]
+
+    def test_missing_multi_pack_index_and_stale_graph(self):
+        """Test cheap index writes are planned without a repack."""
+        stats = {**HEALTHY, "multi_pack_index": 0, "commit_graph_stale": 1}
+        assert plan_maintenance(stats, MaintenanceThresholds()) == [
+            "multi-pack-index",
+            "commit-graph",
+        ]
+
+
+class TestRepositoryStats:
+    """Test cases for repository_stats function."""
+
+    def test_counts_loose_objects(self, repo):
+        """Test loose objects are counted and a missing graph is stale."""
+        stats = repository_stats(repo.git_dir)
+        assert stats["loose_objects"] == 4  # one empty tree and three commits
+        assert stats["packs"] == 0
+        assert stats["commit_graph_stale"] == 1
+
+
+class TestMaintenanceScheduler:
+    """Test cases for MaintenanceScheduler class."""
+
+    def test_maintains_and_reports(self, repo):
+        """Test scheduled repositories are maintained and summarised."""
+        scheduler = MaintenanceScheduler(1, MaintenanceThresholds(loose_objects=1))
+        scheduler.schedule(repo.git_dir, MagicMock())
+
+        assert scheduler.summary() == {
+            "repack": 1,
+            "commit-graph": 1,
+            "maintained": 1,
+        }
+        stats = repository_stats(repo.git_dir)
+        assert stats["loose_objects"] == 0
+        assert stats["packs"] == 1
+        assert stats["commit_graph_stale"] == 0
+
+    def test_failures_are_counted(self):
+        """Test a broken repository is reported as failed."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            logger = MagicMock()
+            scheduler = MaintenanceScheduler(1)
+            scheduler.schedule(temp_dir, logger)
+            assert scheduler.summary() == {"failed": 1}
+            logger.error.assert_called_once()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
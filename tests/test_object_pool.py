@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import tempfile
+
+import pytest
+from git import Repo
+
+# Add src directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from object_pool import ObjectPool, link_object_pool
+
+
+@pytest.fixture
+def network(make_repo, commit):
+    """An upstream repository and a fork with one extra commit."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        upstream = make_repo(os.path.join(temp_dir, "upstream"))
+        fork = Repo.clone_from(upstream.working_dir, os.path.join(temp_dir, "fork"))
+        commit(fork, "fork work")
+        yield temp_dir, upstream, fork
+
+
+class TestObjectPool:
+    """Test cases for ObjectPool class."""
+
+    def test_members_share_one_pool(self, network):
+        """Test forks of one network are fetched into the same pool."""
+        temp_dir, upstream, fork = network
+        pool = ObjectPool(os.path.join(temp_dir, "pool"))
+
+        pool_dir = pool.update("org/upstream", upstream.working_dir, "org/upstream")
+        assert pool.update("org/upstream", fork.working_dir, "me/fork") == pool_dir
+
+        pool_repo = Repo(pool_dir)
+        assert pool_repo.bare
+        assert pool_repo.git.rev_parse("refs/remotes/org_upstream/heads/main") == (
+            upstream.head.commit.hexsha
+        )
+        assert pool_repo.git.rev_parse("refs/remotes/me_fork/heads/main") == (
+            fork.head.commit.hexsha
+        )
+        assert pool_repo.git.config("gc.auto") == "0"
+
+    def test_clone_borrows_objects_from_pool(self, network):
+        """Test a clone with the pool as reference keeps no private objects."""
+        temp_dir, upstream, fork = network
+        pool = ObjectPool(os.path.join(temp_dir, "pool"))
+        pool_dir = pool.update("org/upstream", fork.working_dir, "me/fork")
+
+        # file:// avoids the local clone shortcut that copies all objects
+        clone = Repo.clone_from(
+            f"file://{fork.working_dir}",
+            os.path.join(temp_dir, "clone"),
+            multi_options=[f"--reference={pool_dir}"],
+        )
+        assert clone.git.count_objects("-v").splitlines()[0] == "count: 0"
+        assert not link_object_pool(clone, pool_dir)
+
+
+class TestLinkObjectPool:
+    """Test cases for link_object_pool function."""
+
+    def test_link_existing_repository(self, network):
+        """Test the pool is added to alternates once."""
+        temp_dir, upstream, fork = network
+        pool_dir = ObjectPool(os.path.join(temp_dir, "pool")).update(
+            "org/upstream", upstream.working_dir, "org/upstream"
+        )
+
+        assert link_object_pool(fork, pool_dir)
+        assert not link_object_pool(fork, pool_dir)
+        alternates = os.path.join(fork.git_dir, "objects", "info", "alternates")
+        with open(alternates) as f:
+            assert f.read() == os.path.join(pool_dir, "objects") + "\n"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+
+import pytest
+
+# Add src directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from ref_filter import RefFilter, validate_ref_pattern
+
+
+class TestValidateRefPattern:
+    """Test cases for validate_ref_pattern function."""
+
+    def test_single_wildcard_is_accepted(self):
+        """Test patterns usable in refspecs are returned unchanged."""
+        assert validate_ref_pattern("release/*") == "release/*"
+        assert validate_ref_pattern("main") == "main"
+
+    @pytest.mark.parametrize("pattern", ["", "a/*/b/*", "v?", "[ab]*"])
+    def test_unsupported_patterns_are_rejected(self, pattern):
+        """Test patterns git refspecs cannot express are rejected."""
+        with pytest.raises(ValueError):
+            validate_ref_pattern(pattern)
+
+
+class TestRefFilter:
+    """Test cases for RefFilter class."""
+
+    def test_default_refspecs_fetch_everything(self):
+        """Test no rules give the usual branch and tag refspecs."""
+        ref_filter = RefFilter()
+        assert not ref_filter.active
+        assert ref_filter.refspecs("refs/remotes/origin/", "refs/tags/") == [
+            "+refs/heads/*:refs/remotes/origin/*",
+            "+refs/tags/*:refs/tags/*",
+        ]
+
+    def test_rules_become_refspecs(self):
+        """Test includes become source patterns and excludes negative refspecs."""
+        ref_filter = RefFilter(
+            include_branches=["main", "release/*"],
+            exclude_branches=["release/old-*"],
+            exclude_tags=["nightly-*"],
+        )
+        assert ref_filter.refspecs("refs/heads/", "refs/tags/") == [
+            "+refs/heads/main:refs/heads/main",
+            "+refs/heads/release/*:refs/heads/release/*",
+            "^refs/heads/release/old-*",
+            "+refs/tags/*:refs/tags/*",
+            "^refs/tags/nightly-*",
+        ]
+
+    def test_matches(self):
+        """Test refs are matched like git refspec globs."""
+        ref_filter = RefFilter(exclude_branches=["dependabot/*"], include_tags=["v*"])
+        assert ref_filter.matches("refs/heads/main")
+        assert ref_filter.matches("refs/heads/feature/deep/name")
+        assert not ref_filter.matches("refs/heads/dependabot/npm/lodash")
+        assert ref_filter.matches("refs/tags/v1.0")
+        assert not ref_filter.matches("refs/tags/nightly")
+        assert not ref_filter.matches("refs/pull/1/head")
+
+    def test_override_replaces_given_lists(self):
+        """Test per-repository rules replace only the lists they set."""
+        ref_filter = RefFilter(exclude_branches=["dependabot/*"], exclude_tags=["x"])
+        repo_filter = ref_filter.override({"exclude_branches": ["renovate/*"]})
+        assert repo_filter.exclude_branches == ["renovate/*"]
+        assert repo_filter.exclude_tags == ["x"]
+        assert ref_filter.exclude_branches == ["dependabot/*"]
+
+    def test_with_default_branch(self):
+        """Test the default branch is kept even when the rules leave it out."""
+        ref_filter = RefFilter(
+            include_branches=["feat*"], exclude_branches=["m*", "dependabot/*"]
+        )
+        kept = ref_filter.with_default_branch("main")
+        assert kept.include_branches == ["feat*", "main"]
+        assert kept.exclude_branches == ["dependabot/*"]
+        assert kept.matches("refs/heads/main")
+        assert ref_filter.with_default_branch("feature") is ref_filter
+        assert RefFilter().with_default_branch("main") == RefFilter()
+
+    def test_override_is_validated(self):
+        """Test invalid per-repository rules are rejected."""
+        with pytest.raises(ValueError):
+            RefFilter().override({"include_branches": "main"})
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import tempfile
+
+import pytest
+from git import Repo
+
+# Add src directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from ref_reader import RefSnapshot, find_git_dir
+
+
+def for_each_ref(git_repo):
+    """Return the refs git itself reports, as a name to object id dict."""
+    output = git_repo.git.for_each_ref("--format=%(objectname) %(refname)")
+    refs = {}
+    for line in output.splitlines():
+        sha, ref_name = line.split(" ", 1)
+        if ref_name != "refs/remotes/origin/HEAD":
+            refs[ref_name] = sha
+    return refs
+
+
+@pytest.fixture
+def clone(make_repo):
+    """A clone with packed remote refs, loose local refs and annotated tags."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        origin = make_repo(os.path.join(temp_dir, "origin"))
+        origin.git.tag("-a", "v1", "-m", "release")
+        origin.git.branch("feature/deep/name")
+        git_repo = Repo.clone_from(origin.working_dir, os.path.join(temp_dir, "clone"))
+        yield origin, git_repo
+
+
+class TestRefSnapshot:
+    """Test cases for RefSnapshot class."""
+
+    def test_matches_git_for_packed_and_loose_refs(self, clone, commit):
+        """Test packed refs, peeled tags and loose refs are read like git."""
+        origin, git_repo = clone
+        # The clone wrote packed-refs; loose refs are added and one overrides
+        # its packed entry
+        git_repo.git.branch("local")
+        commit(origin, "more")
+        git_repo.remote().fetch()
+
+        refs = RefSnapshot.read(git_repo.git_dir)
+        assert refs.refs == for_each_ref(git_repo)
+        assert refs.branches() == ["local", "main"]
+        assert refs.with_prefix("refs/remotes/origin/")["main"] == (
+            origin.head.commit.hexsha
+        )
+
+    def test_symrefs(self, clone):
+        """Test HEAD and the remote HEAD symref are resolved to their target."""
+        _, git_repo = clone
+        refs = RefSnapshot.read(git_repo.git_dir)
+        assert refs.head_branch() == "main"
+        assert refs.symref("refs/remotes/origin/HEAD") == "refs/remotes/origin/main"
+        assert "refs/remotes/origin/HEAD" not in refs.refs
+
+        git_repo.git.checkout("--detach")
+        assert RefSnapshot.read(git_repo.git_dir).head_branch() is None
+
+    def test_deleted_packed_ref(self, clone):
+        """Test a ref deleted by git disappears from the snapshot."""
+        _, git_repo = clone
+        git_repo.git.update_ref("-d", "refs/remotes/origin/feature/deep/name")
+        refs = RefSnapshot.read(git_repo.git_dir)
+        assert "refs/remotes/origin/feature/deep/name" not in refs.refs
+        assert refs.refs == for_each_ref(git_repo)
+
+    def test_linked_worktree(self, clone):
+        """Test a linked worktree shares refs but has its own HEAD."""
+        _, git_repo = clone
+        worktree = os.path.join(os.path.dirname(git_repo.working_dir), "wt")
+        git_repo.git.worktree("add", "-b", "wt-branch", worktree)
+
+        refs = RefSnapshot.read(find_git_dir(worktree))
+        assert refs.head_branch() == "wt-branch"
+        assert refs.branches() == ["main", "wt-branch"]
+
+    def test_bare_repository(self, clone):
+        """Test bare repositories are their own git directory."""
+        origin, _ = clone
+        bare_dir = os.path.join(os.path.dirname(origin.working_dir), "bare.git")
+        Repo.clone_from(origin.working_dir, bare_dir, mirror=True)
+        assert find_git_dir(bare_dir) == bare_dir
+        refs = RefSnapshot.read(bare_dir)
+        assert refs.head_branch() == "main"
+        assert refs.branches() == ["feature/deep/name", "main"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
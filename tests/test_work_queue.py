@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import tempfile
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+# Add src directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from work_queue import LeaseHeartbeat, WorkQueue
+
+
+class FakeClock:
+    """Manually advanced wall clock."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def queue_path():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        yield os.path.join(temp_dir, "queue.db")
+
+
+class TestWorkQueue:
+    """Test cases for WorkQueue class."""
+
+    def test_add_ignores_duplicates(self, queue_path):
+        """Test repositories are only enqueued once."""
+        work_queue = WorkQueue(queue_path)
+        assert work_queue.add(["repo1", "repo2"]) == 2
+        assert work_queue.add(["repo2", "repo3"]) == 1
+        assert work_queue.counts() == {"pending": 3}
+
+    def test_claim_in_order_until_empty(self, queue_path):
+        """Test claims follow insertion order and stop when drained."""
+        work_queue = WorkQueue(queue_path)
+        work_queue.add(["repo1", "repo2"])
+
+        assert work_queue.claim("a") == "repo1"
+        assert work_queue.claim("b") == "repo2"
+        assert work_queue.claim("a") is None
+
+    def test_complete_marks_done_or_failed(self, queue_path):
+        """Test completed leases are recorded with their outcome."""
+        work_queue = WorkQueue(queue_path)
+        work_queue.add(["repo1", "repo2"])
+        work_queue.complete(work_queue.claim("a"), "a")
+        work_queue.complete(work_queue.claim("a"), "a", error="clone failed")
+
+        assert work_queue.counts() == {"done": 1, "failed": 1}
+
+    def test_expired_lease_is_requeued(self, queue_path):
+        """Test a repository whose lease expired can be claimed again."""
+        clock = FakeClock()
+        work_queue = WorkQueue(queue_path, lease_seconds=60, clock=clock)
+        work_queue.add(["repo1"])
+        assert work_queue.claim("dead-worker") == "repo1"
+
+        clock.now += 30
+        assert work_queue.claim("b") is None
+
+        clock.now += 31
+        assert work_queue.claim("b") == "repo1"
+        assert not work_queue.heartbeat("repo1", "dead-worker")
+
+        # The late completion from the original worker is ignored
+        work_queue.complete("repo1", "dead-worker", error="killed")
+        assert work_queue.counts() == {"leased": 1}
+
+    def test_heartbeat_extends_lease(self, queue_path):
+        """Test heartbeats keep a lease from expiring."""
+        clock = FakeClock()
+        work_queue = WorkQueue(queue_path, lease_seconds=60, clock=clock)
+        work_queue.add(["repo1"])
+        work_queue.claim("a")
+
+        clock.now += 50
+        assert work_queue.heartbeat("repo1", "a")
+        clock.now += 50
+        assert work_queue.claim("b") is None
+
+
+class TestLeaseHeartbeat:
+    """Test cases for LeaseHeartbeat class."""
+
+    def test_lost_lease_is_reported(self, queue_path):
+        """Test the heartbeat stops and flags a lease another worker claimed."""
+        clock = FakeClock()
+        work_queue = WorkQueue(queue_path, lease_seconds=0.03, clock=clock)
+        work_queue.add(["repo1"])
+        work_queue.claim("a")
+        logger = MagicMock()
+
+        with LeaseHeartbeat(work_queue, "repo1", "a", logger) as heartbeat:
+            time.sleep(0.05)
+            assert not heartbeat.lost
+            clock.now += 1
+            assert work_queue.claim("b") == "repo1"
+            deadline = time.monotonic() + 5
+            while not heartbeat.lost and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+        assert heartbeat.lost
+        logger.warning.assert_called_once()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])